@@ -1,5 +1,11 @@
 from stock import Stock, Sheet
-from visualization import VisualSheet
+from maxrects import MaxRects
+from guillotine import Guillotine
+from sheet_pool import SheetPool
+from skyline import Skyline
+from candidates import Candidates
+from shelves import Shelves
+from tracing import NULL_TRACER
 import logging, sys
 
 
@@ -86,165 +92,473 @@ def cutting_stock_problem(sheet):
     return True
 
 
-def bin_packing_BLF(sheet, rotation=False):
+def update_available_rectangles(
+    available_rectangles, packed_rectangle_index, packed_stock
+):
     """
-    Bin Packing Algorithm: Bottom Left Fill
-    Consists of two steps:
-    1. Try to pack the item in available rectangles
-    2.1. If packed, update the available rectangles
-    2.2. If not packed, create a new rectangle
-
-    :param sheet: Sheet object that contains the stocks
+    Update the available rectangles after packing a stock
+    :param available_rectangles: list of available rectangles
+    :param packed_stock: Stock object that was packed
+    :return: updated available rectangles with the required changes applied.
     """
-
-    def update_available_rectangles(
-        available_rectangles, packed_rectangle_index, packed_stock
-    ):
-        """
-        Update the available rectangles after packing a stock
-        :param available_rectangles: list of available rectangles
-        :param packed_stock: Stock object that was packed
-        :return: updated available rectangles with the required changes applied.
-        """
-        # Get the packed rectangle
-        xr, yr, wr, hr = available_rectangles[packed_rectangle_index]
-        packed_stock_rect = (
-            packed_stock.x,
-            packed_stock.y,
-            packed_stock.width,
-            packed_stock.height,
-        )
-        # Create the new top and right rectangles
-        right_rectangle = (xr + packed_stock.width, yr, wr - packed_stock.width, hr)
-        top_rectangle = (xr, yr + packed_stock.height, wr, hr - packed_stock.height)
-        # Add the new top and right rectangles
-        if wr > packed_stock.width:  # if there's space for a right rectangle
-            available_rectangles.append(right_rectangle)
-        if hr > packed_stock.height:  # top rectangle
-            available_rectangles.append(top_rectangle)
-
-        # Remove the packed rectangle from the available rectangles
-        available_rectangles.pop(packed_rectangle_index)
-
-        # check collision with other rectangles and update the rectangles
-        for i, (xr, yr, wr, hr) in enumerate(available_rectangles):
-            # TODO Think: should the new rectangles be checked upon or the original packed one?
-            if is_intersecting(right_rectangle, (xr, yr, wr, hr)):
-                # if it's on the same plane, then it's eaten by the bottom rectangle
-                if xr == right_rectangle[0] and yr != right_rectangle[1]:
-                    logging.info(
-                        f"{right_rectangle} Eaten by the bottom rectangle {(xr, yr, wr, hr)}"
-                    )  # DEBUG
+    # Get the packed rectangle
+    xr, yr, wr, hr = available_rectangles[packed_rectangle_index]
+    packed_stock_rect = (
+        packed_stock.x,
+        packed_stock.y,
+        packed_stock.width,
+        packed_stock.height,
+    )
+    # Create the new top and right rectangles
+    right_rectangle = (xr + packed_stock.width, yr, wr - packed_stock.width, hr)
+    top_rectangle = (xr, yr + packed_stock.height, wr, hr - packed_stock.height)
+    # Add the new top and right rectangles
+    if wr > packed_stock.width:  # if there's space for a right rectangle
+        available_rectangles.append(right_rectangle)
+    if hr > packed_stock.height:  # top rectangle
+        available_rectangles.append(top_rectangle)
+
+    # Remove the packed rectangle from the available rectangles
+    available_rectangles.pop(packed_rectangle_index)
+
+    # check collision with other rectangles and update the rectangles
+    for i, (xr, yr, wr, hr) in enumerate(available_rectangles):
+        # TODO Think: should the new rectangles be checked upon or the original packed one?
+        if is_intersecting(right_rectangle, (xr, yr, wr, hr)):
+            # if it's on the same plane, then it's eaten by the bottom rectangle
+            if xr == right_rectangle[0] and yr != right_rectangle[1]:
+                logging.info(
+                    "%s Eaten by the bottom rectangle %s",
+                    right_rectangle,
+                    (xr, yr, wr, hr),
+                )  # DEBUG
+                if right_rectangle in available_rectangles:  # not removed yet
                     available_rectangles.remove(
                         right_rectangle
                     )  # remove the right rectangle
-                else:
-                    available_rectangles[i] = (
-                        xr,
-                        yr,
-                        right_rectangle[0] + right_rectangle[2] - xr,
-                        hr,
-                    )
-            if is_intersecting(top_rectangle, (xr, yr, wr, hr)):
-                # if it's on the same plane, then it's eaten by the left rectangle
-                if yr == top_rectangle[1] and xr != top_rectangle[0]:
-                    logging.info(
-                        f"{top_rectangle} Eaten by the left rectangle {(xr, yr, wr, hr)}"
-                    )  # DEBUG
+            else:
+                available_rectangles[i] = (
+                    xr,
+                    yr,
+                    right_rectangle[0] + right_rectangle[2] - xr,
+                    hr,
+                )
+        if is_intersecting(top_rectangle, (xr, yr, wr, hr)):
+            # if it's on the same plane, then it's eaten by the left rectangle
+            if yr == top_rectangle[1] and xr != top_rectangle[0]:
+                logging.info(
+                    "%s Eaten by the left rectangle %s", top_rectangle, (xr, yr, wr, hr)
+                )  # DEBUG
+                if top_rectangle in available_rectangles:  # not removed yet
                     available_rectangles.remove(top_rectangle)
-                else:
-                    available_rectangles[i] = (
-                        xr,
-                        yr,
-                        wr,
-                        top_rectangle[1] + top_rectangle[3] - yr,
-                    )
-            if is_intersecting(packed_stock_rect, (xr, yr, wr, hr)):
-                # update the rectangle so it's cut by the packed stock
-                # example: rect(0, 6, 20, 5) and stock(6, 5, 3, 5) -> cut vertically
-                # example: rect(16, 5, 4, 3) and stock(19, 0, 1, 10) -> cut horizontally
-                # cut the rectangle with the packed stock
+            else:
                 available_rectangles[i] = (
-                    (xr, yr, wr, packed_stock.y - yr)
-                    if packed_stock.y > yr  # is on the top, cutting horizontally
-                    else (xr, yr, packed_stock.x - xr, hr)
+                    xr,
+                    yr,
+                    wr,
+                    top_rectangle[1] + top_rectangle[3] - yr,
                 )
+        if is_intersecting(packed_stock_rect, (xr, yr, wr, hr)):
+            # update the rectangle so it's cut by the packed stock
+            # example: rect(0, 6, 20, 5) and stock(6, 5, 3, 5) -> cut vertically
+            # example: rect(16, 5, 4, 3) and stock(19, 0, 1, 10) -> cut horizontally
+            # cut the rectangle with the packed stock
+            available_rectangles[i] = (
+                (xr, yr, wr, packed_stock.y - yr)
+                if packed_stock.y > yr  # is on the top, cutting horizontally
+                else (xr, yr, packed_stock.x - xr, hr)
+            )
+
+        # Remove the rectangles with zero width or height
+        if available_rectangles[i][2] == 0 or available_rectangles[i][3] == 0:
+            available_rectangles.pop(i)
 
-            # Remove the rectangles with zero width or height
-            if available_rectangles[i][2] == 0 or available_rectangles[i][3] == 0:
-                available_rectangles.pop(i)
+    # Sort the rectangles in descending order of height
+    # old: sort by height, if equal then by width, then by x, then by y: r[3], r[2], r[0], r[1]
+    # new: sort by lower y, if equal then by lower x, then by higher height, then by higher width
+    available_rectangles.sort(key=lambda r: (r[1], r[0], -r[3], -r[2]), reverse=False)
 
-        # Sort the rectangles in descending order of height
-        # old: sort by height, if equal then by width, then by x, then by y: r[3], r[2], r[0], r[1]
-        # new: sort by lower y, if equal then by lower x, then by higher height, then by higher width
-        available_rectangles.sort(
-            key=lambda r: (r[1], r[0], -r[3], -r[2]), reverse=False
-        )
+    return available_rectangles
 
-        return available_rectangles
+
+def BLF_legacy_step(
+    sheet, available_rectangles, stock, rotation=False, tracer=NULL_TRACER
+):
+    """
+    One step of Bottom Left Fill over the legacy list of available
+    rectangles: pack the stock in the first rectangle where it fits
+    :param sheet: where the stock is packed, anything with the
+        validate_pack_step and pack methods of Sheet
+    :param available_rectangles: list of available rectangles
+    :param stock: Stock object to be packed
+    :param rotation: whether the stock can be rotated by 90 degrees
+    :param tracer: see tracing.Tracer
+    :return: (is_packed, available_rectangles)
+    """
+    is_packed = False
+    tracer.observe("free_rectangles", len(available_rectangles))
+    # Find the first rectangle that can fit the stock
+    with tracer.phase("search"):
+        for i, (xr, yr, wr, hr) in enumerate(available_rectangles):
+            if wr < stock.width or hr < stock.height:
+                continue
+            # Pack the stock in the current location
+            logging.info("Packing Stock: %s", stock)  # DEBUG
+            tracer.count("validations")
+            is_packed = sheet.validate_pack_step(stock, (xr, yr))
+
+            if rotation == True:
+                # in this block, we try to rotate the stock and see if it fits
+                # if a better choice, we replace the stock with the rotated one
+                stock_rotated = Stock(
+                    stock.height, stock.width
+                )  # a copy of stock rotated 90 degrees
+                tracer.count("rotations_tried")
+                tracer.count("validations")
+                is_packed_rotated = sheet.validate_pack_step(stock_rotated, (xr, yr))
+                if is_packed_rotated and not is_packed:
+                    stock.rotate90()
+                    is_packed = True
+                if is_packed_rotated and is_packed:
+                    # if both rotations are valid, choose the one with center lower and right
+                    if (
+                        stock.width < stock.height
+                    ):  # if the original stock is taller than it is wide
+                        stock.rotate90()
+                is_packed = (
+                    is_packed or is_packed_rotated
+                )  # if either one is true, then it's packable
+
+            if is_packed:
+                break
+
+    if is_packed:  # if valid, actually pack it
+        with tracer.phase("pack"):
+            sheet.pack(stock, (xr, yr))
+        with tracer.phase("update"):
+            available_rectangles = update_available_rectangles(
+                available_rectangles, i, stock
+            )
+        logging.info("Packed: %s", is_packed)  # DEBUG
+        logging.info("Rectangles: %s", available_rectangles)  # DEBUG
+
+    return is_packed, available_rectangles
+
+
+def bin_packing_BLF(
+    sheet, rotation=False, free_space="legacy", order=None, tracer=NULL_TRACER
+):
+    """
+    Bin Packing Algorithm: Bottom Left Fill
+    Consists of two steps:
+    1. Try to pack the item in available rectangles
+    2.1. If packed, update the available rectangles
+    2.2. If not packed, create a new rectangle
+
+    :param sheet: Sheet object that contains the stocks
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param free_space: how the available rectangles are kept
+        "legacy": the original list of available rectangles
+        "maxrects": maximal rectangles, see maxrects.MaxRects
+    :param order: the unpacked stocks in packing order,
+        default: descending order of height
+    :param tracer: counts and times the steps, see tracing.Tracer
+    """
 
     # Beginning of the main algorithm
     # Sort the stocks in descending order of height
     # stocks.sort(key=lambda s: s.height, reverse=True)
-    stocks = sorted(sheet.unpacked_stocks, key=lambda s: s.height, reverse=True)
+    with tracer.phase("sort"):
+        if order is None:
+            stocks = sorted(sheet.unpacked_stocks, key=lambda s: s.height, reverse=True)
+        else:
+            stocks = list(order)
     logging.info(stocks)  # DEBUG
 
+    if free_space == "maxrects":
+        return _bin_packing_BLF_maxrects(sheet, stocks, rotation, tracer)
+    if free_space != "legacy":
+        raise ValueError(f"Unknown free space strategy: {free_space}")
+
     available_rectangles = [
         (0, 0, sheet.width, sheet.height)  # xr, yr, wr, hr
     ]  # initial the sheet as one available rectangle
     for stock in stocks:
-        is_packed = False
-        # Find the first rectangle that can fit the stock
-        for i, (xr, yr, wr, hr) in enumerate(available_rectangles):
-            if wr >= stock.width and hr >= stock.height:
-                # Pack the stock in the current location
-                logging.info(f"Packing Stock: {stock}")  # DEBUG
-                is_packed = sheet.validate_pack_step(stock, (xr, yr))
-
-                if rotation == True:
-                    # in this block, we try to rotate the stock and see if it fits
-                    # if a better choice, we replace the stock with the rotated one
-                    stock_rotated = Stock(
-                        stock.height, stock.width
-                    )  # a copy of stock rotated 90 degrees
-                    is_packed_rotated = sheet.validate_pack_step(
-                        stock_rotated, (xr, yr)
-                    )
-                    if is_packed_rotated and not is_packed:
-                        stock.rotate90()
-                        is_packed = True
-                    if is_packed_rotated and is_packed:
-                        # if both rotations are valid, choose the one with center lower and right
-                        if (
-                            stock.width < stock.height
-                        ):  # if the original stock is taller than it is wide
-                            stock.rotate90()
-                    is_packed = (
-                        is_packed or is_packed_rotated
-                    )  # if either one is true, then it's packable
-
-                if is_packed:  # if valid, actually pack it
-                    sheet.pack(stock, (xr, yr))
-                    available_rectangles = update_available_rectangles(
-                        available_rectangles, i, stock
-                    )
-                    logging.info(f"Packed: {is_packed}")  # DEBUG
-                    logging.info(f"Rectangles: {available_rectangles}")  # DEBUG
-                    break
+        is_packed, available_rectangles = BLF_legacy_step(
+            sheet, available_rectangles, stock, rotation, tracer
+        )
 
         # after all the rectangles, if still not packed, then it's not packable
         if not is_packed:
-            logging.info(f"Cannot pack the stock {stock}")  # DEBUG
+            logging.info("Cannot pack the stock %s", stock)  # DEBUG
             # return False  # if cannot pack a stock, halt the algorithm
-
-        # VisualSheet(sheet).draw(unpacked=True)  # DEBUG
+    # DEBUG: sheet.recordEvents() before packing, then replay the steps
+    # with VisualSheet(sheet).animate()
     # Algorithm finished
     if len(sheet.unpacked_stocks) > 0:
         return False
     return True
 
 
+def _bin_packing_BLF_maxrects(sheet, stocks, rotation=False, tracer=NULL_TRACER):
+    """
+    Bottom Left Fill over the maximal free rectangles of the sheet.
+    Each stock goes to the lowest, then leftmost position where it fits.
+
+    :param sheet: Sheet object that contains the stocks
+    :param stocks: the stocks in packing order
+    """
+    free_space = MaxRects(sheet.width, sheet.height)
+    for stock in sheet.packed_stocks:  # stocks packed before the algorithm
+        free_space.place(stock.x, stock.y, stock.width, stock.height)
+
+    for stock in stocks:
+        tracer.observe("free_rectangles", len(free_space.free))
+        with tracer.phase("search"):
+            if rotation == True and stock.width != stock.height:
+                tracer.count("rotations_tried")
+            loc, rotated = free_space.find_stock_position(stock, rotation)
+        if rotated:
+            stock.rotate90()
+
+        if loc is not None:
+            tracer.count("validations")
+            with tracer.phase("pack"):
+                is_packed = sheet.pack(stock, loc)
+        if loc is None or not is_packed:
+            logging.info("Cannot pack the stock %s", stock)  # DEBUG
+            continue
+        with tracer.phase("update"):
+            free_space.place(stock.x, stock.y, stock.width, stock.height)
+
+    if len(sheet.unpacked_stocks) > 0:
+        return False
+    return True
+
+
+def bin_packing_skyline(sheet, rotation=False, tracer=NULL_TRACER):
+    """
+    Bin Packing Algorithm: Skyline, lowest gap first
+    The packed stocks form a skyline, repeatedly:
+    1. Take the lowest (then leftmost) gap of the skyline
+    2.1. Pack the widest stock that fits the gap at its left end
+    2.2. If no stock fits, raise the gap to its lowest neighbour
+
+    Stocks of the same width are taken in descending order of height.
+    The skyline is a segment tree and the stocks are kept sorted by width
+    (see candidates.Candidates), so each step costs O(log n + log width).
+    Requires integer stock and sheet widths.
+
+    :param sheet: Sheet object that contains the stocks
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param tracer: see tracing.Tracer
+    """
+    with tracer.phase("sort"):
+        # Sort the stocks in descending order of height
+        stocks = sorted(sheet.unpacked_stocks, key=lambda s: s.height, reverse=True)
+
+        # the stocks that can be packed, sorted by width: (width, -order, rotated)
+        # for equal widths, the one that comes first in the order is the last
+        candidates = []
+        for order, stock in enumerate(stocks):
+            candidates.append((stock.width, -order, False))
+            if rotation == True and stock.width != stock.height:
+                candidates.append((stock.height, -order, True))
+        candidates = Candidates(candidates)
+
+    skyline = Skyline(sheet.width)
+    for stock in sheet.packed_stocks:  # stocks packed before the algorithm
+        top = max(skyline.height_at(x) for x in range(stock.x, stock.x + stock.width))
+        skyline.assign(stock.x, stock.x + stock.width, max(top, stock.y + stock.height))
+
+    placements = []
+    with tracer.phase("search"):
+        while candidates:
+            tracer.count("gaps")
+            x, y, gap_width = skyline.lowest_gap()
+            if y >= sheet.height:
+                break
+
+            # the widest stock that fits the gap
+            candidate = candidates.pop_last((gap_width, 1, True))
+            if candidate is None:
+                if not skyline.fill_gap(x, gap_width):
+                    break  # the remaining stocks are wider than the sheet
+                continue
+
+            width, order, rotated = candidate
+            stock = stocks[-order]
+            if rotated:
+                tracer.count("rotations_tried")
+            height = stock.width if rotated else stock.height
+            if y + height > sheet.height:
+                # this gap is the lowest, so it won't fit anywhere else either
+                logging.info(
+                    "Cannot pack the stock %s rotated=%s", stock, rotated
+                )  # DEBUG
+                continue
+
+            if rotation == True and stock.width != stock.height:
+                # drop the other orientation of the stock, if still there
+                candidates.remove((height, order, not rotated))
+            if rotated:
+                stock.rotate90()
+            placements.append((stock, (x, y)))
+            skyline.assign(x, x + width, y + height)
+
+    # pack them all at once, removing each from the unpacked stocks is O(n)
+    tracer.count("validations", len(placements))
+    with tracer.phase("pack"):
+        sheet.packStocks(placements)
+
+    if len(sheet.unpacked_stocks) > 0:
+        return False
+    return True
+
+
+def bin_packing_guillotine(
+    sheet,
+    rotation=False,
+    choice="best_area",
+    split="shorter_leftover",
+    tracer=NULL_TRACER,
+):
+    """
+    Bin Packing Algorithm: Guillotine
+    Every stock is cut off a free rectangle with edge-to-edge cuts, so the
+    whole layout can be cut on a panel saw. See guillotine.Guillotine for
+    the choice and split heuristics.
+    The stocks are packed in descending order of area.
+
+    :param sheet: Sheet object that contains the stocks, nothing packed yet
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param tracer: see tracing.Tracer
+    :return: (is_success, cut_tree), cut_tree is the root guillotine.CutNode,
+        its cuts() are the saw program
+    """
+    if len(sheet.packed_stocks) > 0:
+        raise ValueError("Guillotine packing needs a sheet with no packed stocks")
+
+    with tracer.phase("sort"):
+        stocks = sorted(sheet.unpacked_stocks, key=lambda s: s.getArea(), reverse=True)
+    free_space = Guillotine(sheet.width, sheet.height, choice=choice, split=split)
+
+    placements = []
+    for stock in stocks:
+        tracer.observe("free_rectangles", len(free_space.free))
+        with tracer.phase("search"):
+            node, score = free_space.find(stock.width, stock.height)
+            if rotation == True and stock.width != stock.height:
+                tracer.count("rotations_tried")
+                node_rotated, score_rotated = free_space.find(stock.height, stock.width)
+                if node_rotated is not None and (node is None or score_rotated < score):
+                    stock.rotate90()
+                    node = node_rotated
+
+        if node is None:
+            logging.info("Cannot pack the stock %s", stock)  # DEBUG
+            continue
+        with tracer.phase("update"):
+            leaf = free_space.place(node, stock)
+        placements.append((stock, (leaf.x, leaf.y)))
+
+    tracer.count("validations", len(placements))
+    with tracer.phase("pack"):
+        sheet.packStocks(placements)
+    return len(sheet.unpacked_stocks) == 0, free_space.root
+
+
+def bin_packing_multi(width, height, stocks, rotation=False, fit="first"):
+    """
+    Multi Bin Packing: pack all the stocks into as many identical sheets as
+    it takes. Each stock goes to the first (or best) open sheet where it
+    fits, at its bottom-left position, see sheet_pool.SheetPool.
+    The stocks are packed in descending order of height.
+
+    :param width, height: size of the sheets
+    :param stocks: the stocks to be packed
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param fit: "first" or "best"
+    :return: (sheets, unpacked_stocks), unpacked_stocks are the ones that
+        don't fit even an empty sheet
+    """
+    pool = SheetPool(width, height, fit=fit, rotation=rotation)
+    unpacked_stocks = []
+    for stock in sorted(stocks, key=lambda s: s.height, reverse=True):
+        if not pool.add(stock):
+            logging.info("Cannot pack the stock %s", stock)  # DEBUG
+            unpacked_stocks.append(stock)
+    return pool.close(), unpacked_stocks
+
+
+def bin_packing_online(
+    width, height, stocks, rotation=False, ratio=0.8, new_sheets=True
+):
+    """
+    Online Bin Packing: pack the stocks in the order they come, from any
+    iterable or generator, on shelves (see shelves.Shelves).
+    Each stock is placed for good before the next one is read, in
+    O(log height) time, and only the open shelves are kept in memory.
+
+    :param width, height: size of the sheets
+    :param stocks: iterable of the stocks to be packed
+    :param rotation: whether the stocks can be rotated by 90 degrees,
+        they are laid flat (wider than tall) when possible
+    :param ratio: ratio of the shelf height classes, in (0, 1)
+    :param new_sheets: start a new sheet when a stock doesn't fit the
+        current one, else the stock is left unpacked
+    :return: a generator of placement events (sheet, stock, (x, y)), sheet
+        is the number of the sheet, from 0. For a stock left unpacked
+        the event is (None, stock, None)
+    """
+    sheet = 0
+    shelves = Shelves(width, height, ratio)
+    for stock in stocks:
+        orientations = [False]
+        if rotation == True and stock.width != stock.height:
+            # flat first, it makes lower shelves
+            orientations = (
+                [False, True] if stock.width > stock.height else [True, False]
+            )
+        # the orientations that fit an empty sheet, a stock that fits none
+        # is left unpacked without giving up the current sheet
+        orientations = [
+            rotated
+            for rotated in orientations
+            if (stock.height if rotated else stock.width) <= width
+            and (stock.width if rotated else stock.height) <= height
+        ]
+
+        loc = None
+        for attempt in range(2 if new_sheets else 1):
+            for rotated in orientations:
+                w, h = (
+                    (stock.height, stock.width)
+                    if rotated
+                    else (stock.width, stock.height)
+                )
+                loc = shelves.place(w, h)
+                if loc is not None:
+                    break
+            if loc is not None or not orientations or not new_sheets:
+                break
+            sheet += 1
+            shelves = Shelves(width, height, ratio)
+
+        if loc is None:
+            logging.info("Cannot pack the stock %s", stock)  # DEBUG
+            yield None, stock, None
+            continue
+        if rotated:
+            stock.rotate90()
+        stock.setLoc(loc)
+        yield sheet, stock, loc
+
+
 def test_and_visualize_BLF():
+    # imported here, so the packers don't need matplotlib
+    from visualization import VisualSheet
+
     logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
     # C2_1
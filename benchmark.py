@@ -1,6 +1,11 @@
 from stock import Stock, Sheet
-from algorithm import bin_packing_BLF
-from visualization import VisualSheet
+from algorithm import bin_packing_BLF, bin_packing_skyline, bin_packing_guillotine
+from render import render_all
+from tracing import NULL_TRACER, CountingTracer
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import io
 import os
 import timeit
 import json
@@ -8,48 +13,231 @@ import json
 DATASET_DIR = "Original_Hopper_Turton/"
 OUTPUT_DIR = "output/"
 
+# packers compared by --compare, name -> function(sheet)
+PACKERS = {
+    "BLF": bin_packing_BLF,
+    "skyline": bin_packing_skyline,
+    "guillotine": bin_packing_guillotine,
+}
 
-if __name__ == "__main__":
-    if not os.path.exists(OUTPUT_DIR):
-        os.mkdir(OUTPUT_DIR)
 
-    testcases = os.listdir(DATASET_DIR)
-    testcases.sort()
+def read_testcase(filename: str) -> Sheet:
+    """
+    Read a testcase file into a sheet with all its stocks unpacked
+    Template of the testcase file:
+        num_stocks
+        sheet_width sheet_height
+        stock_width stock_height
+        ...
+    """
+    with open(filename, "r") as f:
+        num_stocks = int(f.readline().strip())
+        width, height = map(int, f.readline().strip().split(" "))
+        stocks = [
+            Stock(*map(int, f.readline().strip().split())) for i in range(num_stocks)
+        ]
+    # in the order of addStock, without its linear insertion per stock
+    sheet = Sheet(width, height)
+    sheet.insertStocks(stocks)
+    return sheet
 
+
+def compare_packers(
+    packers: dict, testcases: list, dataset_dir: str = DATASET_DIR
+) -> list:
+    """
+    Run every packer on every testcase and print the packing time and the
+    reached height (lower_bound_height) of each
+
+    Args:
+        packers: name -> function(sheet)
+        testcases: testcase filenames in dataset_dir
+
+    Returns:
+        list: one dict per testcase, with the stats of each packer
+    """
+    print(f"{'testcase':<10}" + "".join(f"{name:>28}" for name in packers))
+    results = []
     for testcase in testcases:
-        print(f"----{testcase}----")
-        with open(DATASET_DIR + testcase, "r") as f:
-            num_stocks = int(f.readline().strip())
-            sheet = Sheet(*map(int, f.readline().strip().split(" ")))
-            for i in range(num_stocks):
-                line = f.readline()
-                sheet.addStock(Stock(*map(int, line.strip().split())))
-
-            # start packing
+        result = {"testcase": testcase}
+        line = f"{testcase:<10}"
+        for name, packer in packers.items():
+            sheet = read_testcase(os.path.join(dataset_dir, testcase))
             start = timeit.default_timer()
-            bin_packing_BLF(sheet)
+            packer(sheet)
             elapsedTime = timeit.default_timer() - start
-            stats = sheet.getStats()
-            stats["packing_time"] = elapsedTime
-            print(f"Stats: {sheet.getStats()}")
-            if not os.path.exists(OUTPUT_DIR + testcase):
-                os.mkdir(OUTPUT_DIR + testcase)
-
-            path = OUTPUT_DIR + testcase + "/"
-            # export the sheet.txt
-            sheet.exportSheet(path + "sheet.txt")
-            sheet.to_gcode(path + "sheet.gcode")
-            # export the stats.json
-            with open(path + "stats.json", "w") as f:
-                f.write(json.dumps(stats, indent=4))
-
-            # draw the sheet
-            visual_sheet = VisualSheet(sheet)
-            visual_sheet.draw(unpacked=False, save=True, filename=path + "sheet.png")
-            # save a basic sheet with no text or color as well
-            VisualSheet(sheet, is_txt=False, fillcolor="white").draw(
-                unpacked=False, save=True, filename=path + "sheet_basic.png"
+            result[name] = {
+                "packing_time": elapsedTime,
+                "lower_bound_height": sheet.getLowerBoundHeight(),
+                "efficiency": sheet.getEfficiency(),
+                "num_unpacked_stocks": len(sheet.unpacked_stocks),
+            }
+            line += f"{elapsedTime * 1000:>10.2f}ms"
+            line += (
+                f" h={sheet.getLowerBoundHeight():<5} u={len(sheet.unpacked_stocks):<5}"
             )
             del sheet
+        print(line)
+        results.append(result)
+    return results
+
+
+def export_testcase(sheet: Sheet, stats: dict, path: str) -> None:
+    """
+    Export the packed sheet of a testcase: sheet.txt and stats.json.
+    The drawings and the gcode are rendered from them by render.py
+    """
+    if not os.path.exists(path):
+        os.mkdir(path)
+    # export the sheet.txt
+    filename = path + "sheet.txt"
+    previous = None
+    if os.path.exists(filename):
+        with open(filename, "r") as f:
+            previous = f.read()
+        mtime = os.path.getmtime(filename)
+    sheet.exportSheet(filename)
+    with open(filename, "r") as f:
+        if f.read() == previous:
+            # same packing, keep the renders of the sheet up to date
+            os.utime(filename, (mtime, mtime))
+    # export the stats.json
+    with open(path + "stats.json", "w") as f:
+        f.write(json.dumps(stats, indent=4))
+
+
+def run_trial(job: tuple) -> tuple:
+    """
+    Pack a testcase with bin_packing_BLF, exporting the sheet of the first
+    trial only, and its trace.json if traced (see tracing.CountingTracer)
+
+    Args:
+        job: (dataset_dir, testcase, trial, trace)
+
+    Returns:
+        tuple: (stats, log) the stats of the sheet with the packing_time,
+            and what the export printed
+    """
+    dataset_dir, testcase, trial, trace = job
+    sheet = read_testcase(os.path.join(dataset_dir, testcase))
+    tracer = CountingTracer() if trace else NULL_TRACER
+
+    # start packing
+    start = timeit.default_timer()
+    bin_packing_BLF(sheet, tracer=tracer)
+    elapsedTime = timeit.default_timer() - start
+    stats = sheet.getStats()
+    stats["packing_time"] = elapsedTime
+
+    log = io.StringIO()
+    if trial == 0:
+        # the workers run concurrently, their output is printed in order
+        with contextlib.redirect_stdout(log):
+            export_testcase(sheet, stats, OUTPUT_DIR + testcase + "/")
+        if trace:
+            tracer.export(OUTPUT_DIR + testcase + "/trace.json")
+    del sheet
+    return stats, log.getvalue()
+
+
+def sheet_stats(stats: dict) -> dict:
+    """
+    Get the stats of the sheet alone, without the packing_time
+    """
+    return {k: v for k, v in stats.items() if k != "packing_time"}
+
+
+def run_benchmark(
+    testcases: list,
+    workers: int = 1,
+    trials: int = 1,
+    dataset_dir: str = DATASET_DIR,
+    trace: bool = False,
+) -> dict:
+    """
+    Run every trial of every testcase, in a pool of worker processes if
+    workers > 1. The results and the output are the same as a serial run.
+    With trace, the packing steps are counted and timed, which slows them.
+
+    Returns:
+        dict: testcase -> list of the stats of each trial
+    """
+    jobs = [
+        (dataset_dir, testcase, trial, trace)
+        for testcase in testcases
+        for trial in range(trials)
+    ]
+    results = {testcase: [] for testcase in testcases}
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            trials_done = executor.map(run_trial, jobs)
+        else:
+            trials_done = map(run_trial, jobs)
+
+        for (_, testcase, trial, _), (stats, log) in zip(jobs, trials_done):
+            if trial == 0:
+                print(f"----{testcase}----")
+            print(f"Stats: {sheet_stats(stats)}")
+            print(log, end="")
+            results[testcase].append(stats)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hopper-Turton benchmark")
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="compare the packers (time and height) instead of exporting results",
+    )
+    parser.add_argument(
+        "--dataset",
+        default=DATASET_DIR,
+        help=f"directory of the testcases (default: {DATASET_DIR})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes (default: 1, serial)",
+    )
+    parser.add_argument(
+        "--trials",
+        type=int,
+        default=1,
+        help="number of times each testcase is packed (default: 1)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="write the counters and phase times of the first trial to trace.json",
+    )
+    parser.add_argument(
+        "--render",
+        action="store_true",
+        help="render the drawings and the gcode after packing (see render.py)",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(OUTPUT_DIR):
+        os.mkdir(OUTPUT_DIR)
+
+    testcases = os.listdir(args.dataset)
+    testcases.sort()
+
+    if args.compare:
+        results = compare_packers(PACKERS, testcases, args.dataset)
+        with open(OUTPUT_DIR + "compare.json", "w") as f:
+            f.write(json.dumps(results, indent=4))
+        exit()
+
+    results = run_benchmark(
+        testcases, args.workers, args.trials, args.dataset, args.trace
+    )
+    # every trial of every testcase in one file
+    with open(OUTPUT_DIR + "results.json", "w") as f:
+        f.write(json.dumps(results, indent=4))
 
-        f.close()
+    if args.render:
+        render_all([OUTPUT_DIR + testcase for testcase in testcases], args.workers)
@@ -0,0 +1,167 @@
+from bisect import bisect_right
+import argparse
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def _martello_toth(items, capacity) -> int:
+    """
+    Martello-Toth bound of items (size, weight) laid along a line of the
+    given capacity, no two of them over the same point at once: the
+    weights of the items of size > capacity / 2 add up, and so does the
+    weighted size of the smaller ones that doesn't fit next to them. For
+    every q <= capacity / 2:
+        J1: size > capacity - q, nothing of size >= q fits next to them
+        J2: capacity / 2 < size <= capacity - q
+        J3: q <= size <= capacity / 2
+        bound = w(J1) + w(J2) + ceil((sw(J3) - (capacity - s)w(J2)) / capacity)
+    The items are sorted once and each q is a few bisections over prefix
+    sums, O(n log n).
+
+    With the weight of an item its height, this is the strip height bound
+    of Martello, Monaci and Vigo. With weights 1, the 1D bin count bound.
+    """
+    items = sorted(items)
+    sizes = [size for size, _ in items]
+    # prefix sums of the weights, the weighted sizes and the weighted room
+    # left next to each item
+    weights, areas, rooms = [0], [0], [0]
+    for size, weight in items:
+        weights.append(weights[-1] + weight)
+        areas.append(areas[-1] + size * weight)
+        rooms.append(rooms[-1] + (capacity - size) * weight)
+
+    n = len(items)
+    half = bisect_right(sizes, capacity / 2)  # the first item of J1 or J2
+    best = weights[n] - weights[half]
+    for k in range(half):
+        if k > 0 and sizes[k] == sizes[k - 1]:
+            continue  # the same q
+        j1 = bisect_right(sizes, capacity - sizes[k])
+        rest = areas[half] - areas[k] - (rooms[j1] - rooms[half])
+        best = max(best, weights[n] - weights[half] + max(0, _ceil_div(rest, capacity)))
+    return best
+
+
+def _fitting(width, height, sizes, rotation) -> list:
+    """
+    Get the sizes that fit a width x height sheet in an allowed orientation
+    """
+    return [
+        (w, h)
+        for w, h in sizes
+        if (w <= width and h <= height) or (rotation and h <= width and w <= height)
+    ]
+
+
+def strip_height_bound(width, sizes, rotation=False) -> int:
+    """
+    Get a lower bound of the height needed to pack every stock in a strip
+    of the given width: the best of the continuous (area) bound, the
+    tallest stock and the Martello-Monaci-Vigo bound, O(n log n).
+
+    With rotation, each stock counts with its lowest height that fits the
+    width, and the stocks wider than half the width either way are stacked.
+    The stocks wider than the strip in every allowed orientation can never
+    be packed, they are left out.
+
+    Args:
+        width: width of the strip
+        sizes: the (width, height) of the stocks
+
+    Returns:
+        int: the lower bound, 0 if there are no stocks
+    """
+    sizes = _fitting(width, float("inf"), sizes, rotation)
+    if not sizes:
+        return 0
+    bound = _ceil_div(sum(w * h for w, h in sizes), width)
+    if not rotation:
+        bound = max(bound, max(h for _, h in sizes))
+        return max(bound, _martello_toth(sizes, width))
+
+    stacked = 0
+    for w, h in sizes:
+        low, high = min(w, h), max(w, h)
+        lowest = low if high <= width else high
+        bound = max(bound, lowest)
+        if low > width / 2:
+            stacked += lowest
+    return max(bound, stacked)
+
+
+def bin_count_bound(width, height, sizes, rotation=False) -> int:
+    """
+    Get a lower bound of the number of width x height sheets needed to pack
+    every stock: the best of the continuous (area) bound and the
+    Martello-Vigo L1 bound, O(n log n). The stocks taller than half the
+    sheet can't be stacked, their widths are packed in 1D, and the same for
+    the stocks wider than half the sheet.
+
+    With rotation, the stocks that are larger than half the sheet both ways
+    in every orientation need a sheet each. The stocks that don't fit the
+    sheet in any allowed orientation are left out.
+
+    Args:
+        width, height: size of the sheets
+        sizes: the (width, height) of the stocks
+
+    Returns:
+        int: the lower bound, 0 if there are no stocks
+    """
+    sizes = _fitting(width, height, sizes, rotation)
+    if not sizes:
+        return 0
+    bound = _ceil_div(sum(w * h for w, h in sizes), width * height)
+    if not rotation:
+        tall = [(w, 1) for w, h in sizes if h > height / 2]
+        wide = [(h, 1) for w, h in sizes if w > width / 2]
+        return max(bound, _martello_toth(tall, width), _martello_toth(wide, height))
+
+    alone = 0
+    for w, h in sizes:
+        orientations = [
+            (a, b) for a, b in ((w, h), (h, w)) if a <= width and b <= height
+        ]
+        if all(a > width / 2 and b > height / 2 for a, b in orientations):
+            alone += 1
+    return max(bound, alone)
+
+
+def sheet_sizes(sheet) -> list:
+    """
+    Get the (width, height) of every stock of the sheet, packed or not, as
+    they are oriented now
+    """
+    return [
+        (stock.width, stock.height)
+        for stock in sheet.packed_stocks + sheet.unpacked_stocks
+    ]
+
+
+def optimality_gap(value, bound):
+    """
+    Get the relative gap (value - bound) / bound of a solution to a lower
+    bound, 0.0 if it is proven optimal
+    """
+    if bound <= 0:
+        return 0.0
+    return (value - bound) / bound
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lower bounds of testcases")
+    parser.add_argument("files", nargs="+", help="testcase files")
+    parser.add_argument("--rotation", action="store_true", help="stocks may rotate")
+    args = parser.parse_args()
+
+    for filename in args.files:
+        with open(filename, "r") as f:
+            n = int(f.readline())
+            width, height = map(int, f.readline().split())
+            sizes = [tuple(map(int, f.readline().split())) for _ in range(n)]
+        strip = strip_height_bound(width, sizes, args.rotation)
+        bins = bin_count_bound(width, height, sizes, args.rotation)
+        print(f"{filename}: height >= {strip}, sheets >= {bins}")
@@ -0,0 +1,154 @@
+from stock import Stock, Sheet
+from algorithm import bin_packing_BLF, bin_packing_skyline
+from search import search_ordering
+from collections import OrderedDict
+import hashlib
+import json
+import os
+
+# the packers that can be cached, name -> function(sheet, **options)
+ALGORITHMS = {
+    "BLF": bin_packing_BLF,
+    "skyline": bin_packing_skyline,
+    "search": search_ordering,
+}
+
+
+class PackingCache:
+    """
+    Content-addressed cache of packings.
+
+    A packing is keyed by a canonical form of the instance: the sheet size,
+    the sorted multiset of the stock sizes, the algorithm and its options.
+    Reordering the stocks gives the same key. On a miss the canonical
+    instance (the stocks in sorted order) is packed, so the result only
+    depends on the key, and the placements are stored by position in the
+    sorted stocks. On a hit they are mapped back onto the caller's stocks,
+    stocks of the same size being interchangeable.
+
+    The most recent packings are kept in memory (LRU, max_entries), all of
+    them on disk if a directory is given, one json file per key.
+    """
+
+    def __init__(self, directory: str = None, max_entries: int = 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.memory = OrderedDict()  # key -> placements, least recent first
+        self.hits = 0
+        self.misses = 0
+        if directory is not None and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(sheet: Sheet, algorithm: str, options: dict) -> str:
+        """
+        Get the canonical key of packing the unpacked stocks of the sheet
+        """
+        sizes = sorted((stock.width, stock.height) for stock in sheet.unpacked_stocks)
+        canonical = json.dumps(
+            {
+                "sheet": [sheet.width, sheet.height],
+                "stocks": sizes,
+                "algorithm": algorithm,
+                "options": options,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str):
+        """
+        Get the placements stored for the key, None if there are none
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        if self.directory is None or not os.path.exists(self._path(key)):
+            return None
+        with open(self._path(key), "r") as f:
+            placements = [tuple(placement) for placement in json.load(f)]
+        self._remember(key, placements)
+        return placements
+
+    def put(self, key: str, placements: list) -> None:
+        """
+        Store the placements of a key, in memory and on disk
+        """
+        self._remember(key, placements)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first, a reader never sees half a file
+        with open(path + ".tmp", "w") as f:
+            json.dump(placements, f)
+        os.replace(path + ".tmp", path)
+
+    def _remember(self, key: str, placements: list) -> None:
+        self.memory[key] = placements
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def pack(self, sheet: Sheet, algorithm: str = "BLF", **options) -> bool:
+        """
+        Pack the unpacked stocks of the sheet with the algorithm, or with
+        the cached packing of the same instance
+
+        Args:
+            sheet: a sheet with nothing packed yet
+            algorithm: a name of ALGORITHMS
+            options: the keyword arguments of the algorithm, json serializable
+
+        Returns:
+            bool: True if every stock was packed
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        if len(sheet.packed_stocks) > 0:
+            raise ValueError("Cached packing needs a sheet with no packed stocks")
+
+        key = self.key(sheet, algorithm, options)
+        placements = self.get(key)
+        if placements is None:
+            self.misses += 1
+            placements = self._pack_canonical(sheet, algorithm, options)
+            self.put(key, placements)
+        else:
+            self.hits += 1
+
+        # the caller's stocks in the canonical order
+        stocks = sorted(sheet.unpacked_stocks, key=lambda s: (s.width, s.height))
+        packing = []
+        for i, x, y, width, height in placements:
+            stock = stocks[i]
+            if stock.width != width:
+                stock.rotate90()
+            packing.append((stock, (x, y)))
+        # the same packing as the canonical one, valid already
+        sheet.packStocks(packing, validate=False)
+        return len(sheet.unpacked_stocks) == 0
+
+    @staticmethod
+    def _pack_canonical(sheet: Sheet, algorithm: str, options: dict) -> list:
+        """
+        Pack the canonical instance of the sheet
+
+        Returns:
+            list: the (index, x, y, width, height) of the packed stocks, index
+                is the position of the stock in the sorted stock sizes
+        """
+        sizes = sorted((stock.width, stock.height) for stock in sheet.unpacked_stocks)
+        stocks = [Stock(width, height) for width, height in sizes]
+        canonical = Sheet(sheet.width, sheet.height, list(stocks))
+        ALGORITHMS[algorithm](canonical, **options)
+
+        index = {id(stock): i for i, stock in enumerate(stocks)}
+        return [
+            (index[id(stock)], stock.x, stock.y, stock.width, stock.height)
+            for stock in canonical.packed_stocks
+        ]
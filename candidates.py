@@ -0,0 +1,110 @@
+from bisect import bisect_left, bisect_right
+
+
+class Candidates:
+    """
+    A sorted list of distinct items, e.g. the stocks left to pack, that
+    items can be removed from and added back to.
+
+    The items are sorted once and never moved, a Fenwick tree counts the
+    items left before each position. Removing or adding an item and
+    finding the largest item left up to a key are O(log n), where deleting
+    from or inserting into a sorted Python list shifts it, O(n).
+    """
+
+    def __init__(self, items, left=True):
+        """
+        Args:
+            items: every item that can ever be left
+            left: whether the items are left at first, else none is
+        """
+        self.items = sorted(items)
+        n = len(self.items)
+        self.left = [left] * n
+        self.count = n if left else 0
+        # tree[i] counts the items left in (i - lowbit(i), i], 1-based
+        self.tree = [0] + [i & -i if left else 0 for i in range(1, n + 1)]
+        self.step = 1
+        while self.step * 2 <= n:
+            self.step *= 2
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _update(self, i, left) -> None:
+        self.left[i] = left
+        delta = 1 if left else -1
+        self.count += delta
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _remove_at(self, i) -> None:
+        self._update(i, False)
+
+    def _count_before(self, i) -> int:
+        count = 0
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+        return count
+
+    def _kth(self, k) -> int:
+        """
+        Get the position of the k-th item left, from 1
+        """
+        i, step = 0, self.step
+        while step > 0:
+            if i + step < len(self.tree) and self.tree[i + step] < k:
+                i += step
+                k -= self.tree[i]
+            step //= 2
+        return i
+
+    def pop_last(self, key):
+        """
+        Remove and get the largest item left that is <= key, None if there's
+        none
+        """
+        k = self._count_before(bisect_right(self.items, key))
+        if k == 0:
+            return None
+        i = self._kth(k)
+        self._remove_at(i)
+        return self.items[i]
+
+    def last_below(self, key):
+        """
+        Get the largest item left that is < key, None if there's none
+        """
+        k = self._count_before(bisect_left(self.items, key))
+        if k == 0:
+            return None
+        return self.items[self._kth(k)]
+
+    def add(self, item) -> bool:
+        """
+        Add back an item, one of the items given at first
+
+        Returns:
+            bool: False if it was left already
+        """
+        i = bisect_left(self.items, item)
+        if self.left[i]:
+            return False
+        self._update(i, True)
+        return True
+
+    def remove(self, item) -> bool:
+        """
+        Remove an item, if it's still there
+
+        Returns:
+            bool: False if the item wasn't there
+        """
+        i = bisect_left(self.items, item)
+        if i < len(self.items) and self.items[i] == item and self.left[i]:
+            self._remove_at(i)
+            return True
+        return False
@@ -0,0 +1,442 @@
+from stock import Stock, Sheet
+from algorithm import bin_packing_BLF
+from bounds import strip_height_bound
+from strip import strip_packing
+import argparse
+import time
+
+# the search stops remembering new states beyond this many
+MAX_STATES = 500_000
+# nodes between two checks of the time limit
+CHECK_NODES = 1024
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class _Found(Exception):
+    pass
+
+
+class BranchAndBound:
+    """
+    Exact packing of a few stocks with integer sizes, a depth-first branch
+    and bound.
+
+    The sheet is decided cell by cell, in bottom-left order: the lowest,
+    leftmost cell that isn't decided yet is either the bottom-left corner
+    of a stock, or it's left empty. Every packing is found that way. The
+    cells decided so far form a skyline, the height of each column.
+
+    Bounds: the cells left empty are wasted, and so are the cells above the
+    lowest segment of the skyline, up to its lower neighbour, that no sum
+    of the widths of the stocks left can fill. A segment where no stock
+    fits is raised to its lower neighbour at once. Stocks of the same size
+    are interchangeable, and the states (stocks left, skyline) already
+    searched are remembered and skipped.
+
+    The best packing found so far is kept, the search stops at the time
+    limit and reports whether it is proven optimal.
+    """
+
+    def __init__(self, width, sizes: list, rotation=False, time_limit=None):
+        """
+        Args:
+            width: width of the sheet
+            sizes: the (width, height) of the stocks
+            rotation: whether the stocks can be rotated by 90 degrees
+            time_limit: in seconds, None for no limit
+        """
+        self.width = width
+        self.rotation = rotation
+        self.time_limit = time_limit
+        # the distinct sizes, largest area first, and the stocks of each
+        self.stocks = {}
+        for i, size in enumerate(sizes):
+            self.stocks.setdefault(self.size_key(size), []).append(i)
+        self.types = sorted(self.stocks, key=lambda s: (-s[0] * s[1], s))
+        self.orientations = []
+        for w, h in self.types:
+            both = rotation and w != h
+            self.orientations.append(((w, h), (h, w)) if both else ((w, h),))
+        self.areas = [w * h for w, h in self.types]
+        self.nodes = 0
+        self.optimal = False
+        self.target = None  # the strip search stops at this height
+
+    def size_key(self, size: tuple) -> tuple:
+        """
+        Get the type of a stock size, both orientations are one type with
+        rotation
+        """
+        return tuple(sorted(size, reverse=True)) if self.rotation else tuple(size)
+
+    def pack_sheet(self, height, incumbent: list = None) -> list:
+        """
+        Pack the most stock area into a sheet of the given height
+
+        Args:
+            incumbent: a packing to start from, see typed_placements
+
+        Returns:
+            list: the (index, x, y, width, height) of the packed stocks of
+                the best packing found, index in the sizes
+        """
+        self.mode, self.limit = "sheet", height
+        self.best = incumbent or []
+        self.best_value = sum(w * h for _, _, _, w, h in self.best)
+        return self._solve()
+
+    def pack_all(self, height) -> list:
+        """
+        Pack every stock into a sheet of the given height, the search stops
+        at the first packing found
+
+        Returns:
+            list: the packing, see pack_sheet, None if there is none, or
+                none was found before the time limit
+        """
+        self.target = height
+        placements = self.pack_strip([], height + 1)
+        self.target = None
+        return placements if self.best_value <= height else None
+
+    def pack_strip(self, incumbent: list, height=None) -> list:
+        """
+        Pack every stock as low as possible
+
+        Args:
+            incumbent: a packing of every stock, see typed_placements
+            height: the height of the incumbent, default: its highest top
+
+        Returns:
+            list: the packing of the lowest height found, see pack_sheet
+        """
+        self.mode = "strip"
+        self.best = incumbent
+        if height is None:
+            height = max((y + h for _, _, y, _, h in incumbent), default=0)
+        self.best_value = height
+        self.limit = self.best_value - 1
+        return self._solve()
+
+    def _solve(self) -> list:
+        self.start = time.perf_counter()
+        self.nodes = 0
+        self.seen = set()
+        self.path = []
+        counts = tuple(len(self.stocks[size]) for size in self.types)
+        remaining = sum(count * area for count, area in zip(counts, self.areas))
+        try:
+            self._search((0,) * self.width, counts, 0, remaining, 0)
+            self.optimal = True
+        except _Found:
+            self.optimal = True
+        except _OutOfTime:
+            self.optimal = False
+        return self.indexed_placements(self.best)
+
+    def _record(self, value) -> None:
+        self.best_value = value
+        self.best = list(self.path)
+        if self.mode == "strip":
+            self.limit = value - 1
+            if self.target is not None and value <= self.target:
+                raise _Found()
+
+    def _search(self, skyline, counts, area, remaining, top) -> None:
+        self.nodes += 1
+        if (
+            self.time_limit is not None
+            and self.nodes % CHECK_NODES == 0
+            and time.perf_counter() - self.start > self.time_limit
+        ):
+            raise _OutOfTime()
+
+        if self.mode == "sheet" and area > self.best_value:
+            self._record(area)
+        if self.mode == "strip" and remaining == 0:
+            if top < self.best_value:
+                self._record(top)
+            return
+
+        while True:
+            # the lowest, leftmost segment of the skyline
+            y = min(skyline)
+            x = skyline.index(y)
+            end = x + 1
+            while end < self.width and skyline[end] == y:
+                end += 1
+            gap = end - x
+            # the orientations of the stocks left that fit in it
+            fits = [
+                (t, w, h)
+                for t, count in enumerate(counts)
+                if count > 0
+                for w, h in self.orientations[t]
+                if w <= gap and y + h <= self.limit
+            ]
+            if fits:
+                break
+            # nothing will be packed in the segment, raise it
+            neighbours = [skyline[i] for i in (x - 1, end) if 0 <= i < self.width]
+            if not neighbours:
+                return  # the skyline is flat, nothing fits anymore
+            raised = min(neighbours)
+            skyline = skyline[:x] + (raised,) * gap + skyline[end:]
+
+        key = (counts, skyline)
+        if key in self.seen:
+            return
+        if len(self.seen) < MAX_STATES:
+            self.seen.add(key)
+
+        decided = sum(skyline) + self._gap_waste(skyline, x, end, counts, fits)
+        if self.mode == "sheet":
+            # the area of the stocks left that still fit somewhere
+            fitting = sum(
+                count * self.areas[t]
+                for t, count in enumerate(counts)
+                if any(
+                    w <= self.width and y + h <= self.limit
+                    for w, h in self.orientations[t]
+                )
+            )
+            room = self.width * self.limit - decided
+            if area + min(fitting, room) <= self.best_value:
+                return
+        else:
+            needed = decided + remaining
+            lowest = max(
+                min(h for w, h in self.orientations[t] if w <= self.width)
+                for t, count in enumerate(counts)
+                if count > 0
+            )
+            if max(top, y + lowest, -(-needed // self.width)) >= self.best_value:
+                return
+
+        # pack a stock at the corner of the segment, the largest first
+        for t, w, h in fits:
+            next_counts = counts[:t] + (counts[t] - 1,) + counts[t + 1 :]
+            self.path.append((t, x, y, w, h))
+            self._search(
+                skyline[:x] + (y + h,) * w + skyline[x + w :],
+                next_counts,
+                area + w * h,
+                remaining - w * h,
+                max(top, y + h),
+            )
+            self.path.pop()
+        # or leave the corner cell empty
+        self._search(
+            skyline[:x] + (y + 1,) + skyline[x + 1 :], counts, area, remaining, top
+        )
+
+    def _gap_waste(self, skyline, x, end, counts, fits) -> int:
+        """
+        Get the area that will be wasted above the segment [x, end) of the
+        skyline, up to its lower neighbour: only the stocks packed in the
+        segment fill it, at most the largest sum of their widths that fits
+        """
+        neighbours = [skyline[i] for i in (x - 1, end) if 0 <= i < self.width]
+        if not neighbours:
+            return 0
+        gap = end - x
+        mask = (1 << (gap + 1)) - 1
+        reachable = 1  # bit i: some stocks are i wide in total
+        widths = {}
+        for t, w, _ in fits:
+            widths.setdefault(t, []).append(w)
+        for t, type_widths in widths.items():
+            for _ in range(counts[t]):
+                shifted = reachable
+                for w in type_widths:
+                    shifted |= reachable << w
+                reachable = shifted & mask
+        return (gap - reachable.bit_length() + 1) * (min(neighbours) - skyline[x])
+
+    def typed_placements(self, rects: list) -> list:
+        """
+        Get the (type, x, y, width, height) of packed (x, y, width, height)
+        stocks, to start a search from
+        """
+        return [
+            (self.types.index(self.size_key((w, h))), x, y, w, h)
+            for x, y, w, h in rects
+        ]
+
+    def indexed_placements(self, best: list) -> list:
+        """
+        Get the (index, x, y, width, height) of (type, x, y, width, height)
+        placements, the stocks of a type taken in order
+        """
+        taken = [0] * len(self.types)
+        placements = []
+        for t, x, y, w, h in best:
+            placements.append((self.stocks[self.types[t]][taken[t]], x, y, w, h))
+            taken[t] += 1
+        return placements
+
+
+def _rects(sheet: Sheet) -> list:
+    return [(s.x, s.y, s.width, s.height) for s in sheet.packed_stocks]
+
+
+def _heuristic_rects(width, height, sizes, rotation) -> list:
+    """
+    The best packing of bin_packing_BLF, with the legacy or the maxrects
+    free space
+    """
+    best = None
+    for free_space in ("legacy", "maxrects"):
+        sheet = Sheet(width, height, [Stock(w, h) for w, h in sizes])
+        bin_packing_BLF(sheet, rotation=rotation, free_space=free_space)
+        if best is None or sheet.getAreaUsed() > best.getAreaUsed():
+            best = sheet
+    return _rects(best)
+
+
+def _pack(sheet: Sheet, stocks: list, placements: list) -> None:
+    packing = []
+    for i, x, y, width, height in placements:
+        stock = stocks[i]
+        if stock.width != width:
+            stock.rotate90()
+        packing.append((stock, (x, y)))
+    sheet.packStocks(packing)
+
+
+def exact_packing(sheet: Sheet, rotation=False, time_limit=10.0) -> bool:
+    """
+    Pack the most area of the unpacked stocks into the sheet, exactly, see
+    BranchAndBound. Meant for small instances, up to about 30 stocks.
+    If the stocks may all fit, it first looks for a packing of all of them,
+    then searches from the best packing of bin_packing_BLF.
+
+    :param sheet: Sheet object that contains the stocks, nothing packed yet
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param time_limit: in seconds, None for no limit. At the limit the best
+        packing found so far is packed
+    :return: True if the packing is proven optimal
+    """
+    if len(sheet.packed_stocks) > 0:
+        raise ValueError("Exact packing needs a sheet with no packed stocks")
+    start = time.perf_counter()
+    stocks = list(sheet.unpacked_stocks)
+    sizes = [(stock.width, stock.height) for stock in stocks]
+    solver = BranchAndBound(sheet.width, sizes, rotation, time_limit)
+
+    # first, if the stocks may all fit, look for a packing of all of them
+    if sum(w * h for w, h in sizes) <= sheet.width * sheet.height:
+        placements = solver.pack_all(sheet.height)
+        if placements is not None:
+            _pack(sheet, stocks, placements)
+            return True
+        if time_limit is not None:
+            solver.time_limit = max(0.0, time_limit - (time.perf_counter() - start))
+
+    incumbent = _heuristic_rects(sheet.width, sheet.height, sizes, rotation)
+    placements = solver.pack_sheet(sheet.height, solver.typed_placements(incumbent))
+    _pack(sheet, stocks, placements)
+    return solver.optimal
+
+
+def exact_strip_packing(sheet: Sheet, rotation=False, time_limit=10.0) -> tuple:
+    """
+    Pack every stock of the sheet in the lowest height, exactly, see
+    BranchAndBound and strip.strip_packing. Meant for small instances, up
+    to about 30 stocks. The search starts from strip.strip_packing.
+
+    :param sheet: Sheet object that contains the stocks, nothing packed yet,
+        its height is ignored
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param time_limit: in seconds, None for no limit. At the limit the
+        lowest packing found so far is returned
+    :return: (strip, is_optimal) strip is a new sheet, as high as the
+        packing, with copies of the stocks packed
+    """
+    sizes = [(stock.width, stock.height) for stock in sheet.unpacked_stocks]
+    heuristic = strip_packing(sheet, rotation=rotation)
+    solver = BranchAndBound(sheet.width, sizes, rotation, time_limit)
+    incumbent = solver.typed_placements(_rects(heuristic))
+    if heuristic.height > strip_height_bound(sheet.width, sizes, rotation):
+        placements = solver.pack_strip(incumbent)
+    else:
+        solver.optimal = True  # the heuristic reached the lower bound
+        placements = solver.indexed_placements(incumbent)
+
+    stocks = [Stock(w, h) for w, h in sizes]
+    height = max((y + h for _, _, y, _, h in placements), default=0)
+    strip = Sheet(sheet.width, height, list(stocks))
+    _pack(strip, stocks, placements)
+    return strip, solver.optimal
+
+
+def benchmark(testcases: list, rotation=False, time_limit=10.0) -> list:
+    """
+    Compare bin_packing_BLF with exact_packing and exact_strip_packing on
+    each testcase, e.g. Original_Hopper_Turton/C1_1
+
+    Returns:
+        list: one dict per testcase, with the results of each
+    """
+    from benchmark import read_testcase
+
+    print(f"{'testcase':<32}{'BLF':>24}{'exact':>30}{'exact strip':>24}")
+    results = []
+    for testcase in testcases:
+        result = {"testcase": testcase}
+        for name, pack in (
+            ("BLF", lambda sheet: bin_packing_BLF(sheet, rotation=rotation)),
+            ("exact", lambda sheet: exact_packing(sheet, rotation, time_limit)),
+        ):
+            sheet = read_testcase(testcase)
+            start = time.perf_counter()
+            optimal = pack(sheet)
+            result[name] = {
+                "packing_time": time.perf_counter() - start,
+                "efficiency": sheet.getEfficiency(),
+                "num_unpacked_stocks": len(sheet.unpacked_stocks),
+                "optimal": optimal if name == "exact" else None,
+            }
+        sheet = read_testcase(testcase)
+        start = time.perf_counter()
+        strip, optimal = exact_strip_packing(sheet, rotation, time_limit)
+        result["exact strip"] = {
+            "packing_time": time.perf_counter() - start,
+            "height": strip.height,
+            "optimal": optimal,
+        }
+        results.append(result)
+
+        blf, exact, strip = result["BLF"], result["exact"], result["exact strip"]
+        print(
+            f"{testcase:<32}"
+            f"{blf['packing_time'] * 1000:>9.2f}ms "
+            f"e={blf['efficiency']:.3f} u={blf['num_unpacked_stocks']:<3}"
+            f"{exact['packing_time'] * 1000:>11.2f}ms "
+            f"e={exact['efficiency']:.3f} u={exact['num_unpacked_stocks']:<3}"
+            f"{'*' if exact['optimal'] else ' ':<3}"
+            f"{strip['packing_time'] * 1000:>11.2f}ms "
+            f"h={strip['height']:<5}{'*' if strip['optimal'] else ' '}"
+        )
+    print("* proven optimal")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exact packing of small testcases")
+    parser.add_argument(
+        "testcases",
+        nargs="*",
+        default=[f"Original_Hopper_Turton/C1_{i}" for i in (1, 2, 3)],
+        help="testcase files (default: the C1 testcases)",
+    )
+    parser.add_argument("--rotation", action="store_true", help="stocks may rotate")
+    parser.add_argument(
+        "--time-limit", type=float, default=10.0, help="seconds per search"
+    )
+    args = parser.parse_args()
+
+    benchmark(args.testcases, args.rotation, args.time_limit)
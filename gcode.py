@@ -0,0 +1,371 @@
+from stock import Sheet
+from collections import defaultdict
+import argparse
+import itertools
+import math
+import numpy as np
+
+# strings, lines or blocks of lines, written at once by write_lines
+CHUNK_LINES = 4096
+
+
+def write_lines(lines, f, chunk_lines: int = CHUNK_LINES) -> int:
+    """
+    Write the strings of a generator, each one or more lines, to a
+    file-like object, chunk_lines strings at once: the memory used doesn't
+    grow with the length of the gcode
+
+    Returns:
+        int: the number of strings written
+    """
+    count = 0
+    while True:
+        chunk = list(itertools.islice(lines, chunk_lines))
+        if not chunk:
+            return count
+        f.write("".join(chunk))
+        count += len(chunk)
+
+
+def _rectangle_gcode(x, y, w, h, feed_rate, is_stock=True) -> str:
+    gcode = (
+        f"G00 X{x} Y{y}\n"  # Rapid move to starting point
+        "G00 Z0\n"  # Optional: Lower the tool before drawing
+        f"G01 X{x + w} F{feed_rate}\n"  # Draw first side
+        f"G01 Y{y + h}\n"  # Draw second side
+        f"G01 X{x}\n"  # Draw third side
+        f"G01 Y{y}\n"  # Draw fourth side
+        "G00 Z10\n"
+    )
+    if is_stock:
+        cx, cy = x + w / 2, y + h / 2
+        gcode += (
+            # draw a + in the center
+            f"G00 X{cx} Y{cy}\n"
+            "G00 Z0\n"
+            f"G01 X{cx + 0.02 * w}\n"
+            f"G01 X{cx - 0.02 * w}\n"
+            f"G01 X{cx}\n"
+            f"G01 Y{cy + 0.02 * h}\n"
+            f"G01 Y{cy - 0.02 * h}\n"
+            "G00 Z10\n"  # Optional: Raise the tool after drawing
+        )
+    return gcode
+
+
+def gcode_lines(sheet: Sheet, canvas_size_mm: tuple = (210, 297), feed_rate: int = 200):
+    """
+    Generate the gcode of a sheet, the lines of a rectangle at a time: the
+    canvas border, then each stock with a + in its center, the stocks
+    sorted by x + y and scaled to the canvas. The sheet is left unchanged.
+    """
+    # 20mm smaller than the canvas size
+    canvas_size_mm = (canvas_size_mm[0] - 20, canvas_size_mm[1] - 20)
+
+    yield "G21 G90\n"  # set units to mm and absolute positioning
+    yield f"F{feed_rate}\n"
+    # draw canvas sheet borders
+    yield _rectangle_gcode(
+        0, 0, canvas_size_mm[0], canvas_size_mm[1], feed_rate, is_stock=False
+    )
+    # draw the stocks, sorted by x + y
+    for stock in sorted(sheet.packed_stocks, key=lambda stock: stock.y + stock.x):
+        yield _rectangle_gcode(
+            stock.x * canvas_size_mm[0] / sheet.width,
+            stock.y * canvas_size_mm[1] / sheet.height,
+            stock.width * canvas_size_mm[0] / sheet.width,
+            stock.height * canvas_size_mm[1] / sheet.height,
+            feed_rate,
+        )
+    yield "G28\n"  # home all axes
+    yield "M30\n"  # end program
+
+
+def merge_intervals(intervals: list) -> list:
+    """
+    Get the union of the [start, end] intervals on a line, the overlapping
+    and touching ones merged, sorted
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def cut_segments(width, height, rects) -> list:
+    """
+    Get the segments to cut for the rectangles and the sheet border. The
+    edges shared by neighbouring rectangles, and the collinear edges that
+    touch, are merged into single segments, so nothing is cut twice.
+
+    Args:
+        width, height: size of the sheet
+        rects: the (x, y, width, height) of the rectangles
+
+    Returns:
+        list: the segments ((x0, y0), (x1, y1))
+    """
+    horizontal = defaultdict(list)  # y -> [(x0, x1), ...]
+    vertical = defaultdict(list)  # x -> [(y0, y1), ...]
+    for x, y, w, h in [(0, 0, width, height)] + list(rects):
+        horizontal[y].append((x, x + w))
+        horizontal[y + h].append((x, x + w))
+        vertical[x].append((y, y + h))
+        vertical[x + w].append((y, y + h))
+
+    segments = []
+    for y, intervals in horizontal.items():
+        segments.extend(((x0, y), (x1, y)) for x0, x1 in merge_intervals(intervals))
+    for x, intervals in vertical.items():
+        segments.extend(((x, y0), (x, y1)) for y0, y1 in merge_intervals(intervals))
+    return segments
+
+
+def route_segments(
+    segments: list, start: tuple = (0, 0), window: int = 500, max_passes: int = 20
+) -> list:
+    """
+    Order and orient the segments to shorten the rapid moves between them:
+    nearest neighbour from the start point (see _nearest_neighbour), then
+    2-opt. A 2-opt move reverses a run of the route, which also flips each
+    segment of the run.
+
+    Args:
+        segments: the segments ((x0, y0), (x1, y1)) to cut
+        start: where the tool is at first
+        window: 2-opt only reverses runs of up to window segments
+        max_passes: max number of 2-opt passes over the route
+
+    Returns:
+        list: the segments in cutting order, each from its start to its end
+    """
+    if not segments:
+        return []
+    points = np.asarray(segments, dtype=np.float64)  # (n, 2 ends, 2)
+    order = _nearest_neighbour(points.reshape(-1, 2).tolist(), start)
+    n = len(points)
+    starts, ends = points[order // 2, order % 2], points[order // 2, 1 - order % 2]
+
+    # 2-opt: reverse the run i..j if it shortens the rapid moves into
+    # segment i and out of segment j, the moves within the run keep their
+    # lengths
+    origin = np.asarray(start, dtype=np.float64)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n):
+            before = ends[i - 1] if i > 0 else origin
+            j = np.arange(i, min(n, i + window))
+            after = starts[np.minimum(j + 1, n - 1)]
+            has_after = j + 1 < n  # the route ends anywhere
+            old = _dist(before, starts[i]) + has_after * _dist(ends[j], after)
+            new = _dist(before, ends[j]) + has_after * _dist(starts[i], after)
+            k = np.argmin(new - old)
+            if new[k] - old[k] < -1e-9:
+                run = slice(i, j[k] + 1)
+                starts[run], ends[run] = (
+                    ends[run][::-1].copy(),
+                    starts[run][::-1].copy(),
+                )
+                improved = True
+        if not improved:
+            break
+    return [(tuple(s), tuple(e)) for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+def _nearest_neighbour(endpoints: list, start: tuple) -> np.ndarray:
+    """
+    Order the segments by nearest neighbour from the start point: go to the
+    closest end of a segment not cut yet, the lowest index on ties.
+
+    The ends are bucketed in a uniform grid of about 2 per cell, and each
+    step looks at the rings of cells around the tool until no closer end
+    can be further out, or at every non-empty cell if there are fewer. The
+    grid is rebuilt with larger cells when a quarter of the ends are left,
+    so the cells stay about as dense. The ends of a layout are spread over
+    the sheet, so a step looks at a few cells: about O(n) for the whole
+    order, vs. O(n^2) comparing with every end left. Clustered ends can
+    still make a step look at O(n) cells.
+
+    Args:
+        endpoints: the (x, y) of the ends, 2 * i and 2 * i + 1 for segment i
+
+    Returns:
+        np.ndarray: the first end of each segment, in cutting order
+    """
+    remaining = [True] * (len(endpoints) // 2)
+    x0 = min(x for x, _ in endpoints)
+    y0 = min(y for _, y in endpoints)
+    x1 = max(x for x, _ in endpoints)
+    y1 = max(y for _, y in endpoints)
+
+    def build(ends):
+        # (col, row) -> the ends in the cell, col and row from 0
+        per_cell = max(1, len(ends) / 2)
+        size = math.sqrt((x1 - x0) * (y1 - y0) / per_cell)
+        if size == 0:  # the ends are on a line, or a point
+            size = max(x1 - x0, y1 - y0) / per_cell or 1.0
+        cells = {}
+        for e in ends:
+            x, y = endpoints[e]
+            cells.setdefault((int((x - x0) / size), int((y - y0) / size)), []).append(e)
+        return size, cells, len(ends)
+
+    size, cells, built = build(range(len(endpoints)))
+    left = len(endpoints)
+    order = []
+    px, py = start
+    while left > 0:
+        if 4 * left < built:
+            ends = [e for cell in cells.values() for e in cell if remaining[e // 2]]
+            size, cells, built = build(ends)
+        col, row = math.floor((px - x0) / size), math.floor((py - y0) / size)
+
+        best = None  # (distance, end)
+        r = 0
+        while True:
+            everywhere = (2 * r + 1) ** 2 >= len(cells)
+            if everywhere:
+                ring = list(cells)  # the rings cover more cells than there are
+            elif r == 0:
+                ring = [(col, row)]
+            else:
+                ring = [(col + d, row + s) for d in range(-r, r + 1) for s in (-r, r)]
+                ring += [(col + s, row + d) for d in range(1 - r, r) for s in (-r, r)]
+            for key in ring:
+                for e in cells.get(key, ()):
+                    if remaining[e // 2]:
+                        x, y = endpoints[e]
+                        candidate = (math.hypot(x - px, y - py), e)
+                        if best is None or candidate < best:
+                            best = candidate
+            # the ends beyond ring r are at least r cells away
+            if everywhere or (best is not None and best[0] < r * size):
+                break
+            r += 1
+
+        e = best[1]
+        remaining[e // 2] = False
+        left -= 2
+        order.append(e)
+        px, py = endpoints[e ^ 1]
+    return np.asarray(order)
+
+
+def _dist(a, b):
+    return np.hypot(*np.subtract(a, b).T)
+
+
+def toolpath_lengths(route: list, start: tuple = (0, 0)) -> dict:
+    """
+    Get the total cut length and rapid move distance of a route
+
+    Args:
+        route: the segments ((x0, y0), (x1, y1)) in cutting order
+        start: where the tool is at first
+    """
+    cut, rapid = 0.0, 0.0
+    position = start
+    for segment_start, segment_end in route:
+        rapid += math.dist(position, segment_start)
+        cut += math.dist(segment_start, segment_end)
+        position = segment_end
+    return {"segments": len(route), "cut_length": cut, "rapid_length": rapid}
+
+
+def legacy_route(width, height, rects) -> list:
+    """
+    Get the route of Sheet.to_gcode: the sheet border, then the four sides
+    of each rectangle, the rectangles sorted by x + y. The + marks drawn in
+    the rectangles are left out.
+    """
+    route = []
+    for x, y, w, h in [(0, 0, width, height)] + sorted(
+        rects, key=lambda rect: rect[0] + rect[1]
+    ):
+        corners = [(x, y), (x + w, y), (x + w, y + h), (x, y + h), (x, y)]
+        route.extend(zip(corners, corners[1:]))
+    return route
+
+
+def scale_route(route: list, sx: float, sy: float) -> list:
+    return [((x0 * sx, y0 * sy), (x1 * sx, y1 * sy)) for (x0, y0), (x1, y1) in route]
+
+
+def route_lines(route: list, feed_rate: int = 200):
+    """
+    Generate the gcode of a route line by line, the tool is only lifted
+    between segments that don't connect
+    """
+    yield "G21 G90\n"  # set units to mm and absolute positioning
+    yield f"F{feed_rate}\n"
+    position, tool_down = (0.0, 0.0), False
+    for (x0, y0), (x1, y1) in route:
+        if not tool_down or math.dist(position, (x0, y0)) > 1e-9:
+            if tool_down:
+                yield "G00 Z10\n"  # raise the tool
+            yield f"G00 X{x0:.3f} Y{y0:.3f}\n"
+            yield "G00 Z0\n"  # lower the tool
+            tool_down = True
+        yield f"G01 X{x1:.3f} Y{y1:.3f}\n"
+        position = (x1, y1)
+    yield "G00 Z10\n"
+    yield "G28\n"  # home all axes
+    yield "M30\n"  # end program
+
+
+def write_optimized_gcode(
+    sheet: Sheet,
+    filename: str,
+    canvas_size_mm: tuple = (210, 297),
+    feed_rate: int = 200,
+) -> dict:
+    """
+    Write the gcode of a sheet with the shared edges merged and the segments
+    routed to shorten the rapid moves, see cut_segments, route_segments and
+    route_lines.
+
+    Returns:
+        dict: the toolpath lengths (see toolpath_lengths), in mm, of the
+            route of Sheet.to_gcode ("before") and of the optimized one
+            ("after")
+    """
+    # 20mm smaller than the canvas size, like Sheet.to_gcode
+    sx = (canvas_size_mm[0] - 20) / sheet.width
+    sy = (canvas_size_mm[1] - 20) / sheet.height
+    rects = [(s.x, s.y, s.width, s.height) for s in sheet.packed_stocks]
+
+    before = scale_route(legacy_route(sheet.width, sheet.height, rects), sx, sy)
+    segments = scale_route(cut_segments(sheet.width, sheet.height, rects), sx, sy)
+    route = route_segments(segments)
+
+    with open(filename, "w") as f:
+        print(f"Exporting gcode to {filename}")
+        write_lines(route_lines(route, feed_rate), f)
+
+    return {"before": toolpath_lengths(before), "after": toolpath_lengths(route)}
+
+
+def format_lengths(lengths: dict) -> str:
+    """
+    Format the toolpath lengths of write_optimized_gcode
+    """
+    before, after = lengths["before"], lengths["after"]
+    lines = []
+    for key, name in (("cut_length", "Cut length"), ("rapid_length", "Rapid moves")):
+        saved = 1 - after[key] / before[key] if before[key] else 0.0
+        lines.append(
+            f"{name}: {before[key]:.1f}mm -> {after[key]:.1f}mm ({saved:.0%} saved)"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write optimized gcode of sheets")
+    parser.add_argument("sheet", help="sheet.txt file, see exportSheet")
+    parser.add_argument("gcode", help="output gcode file")
+    args = parser.parse_args()
+
+    Sheet.importSheet(args.sheet).to_gcode(args.gcode, optimize=True)
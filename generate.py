@@ -0,0 +1,114 @@
+import argparse
+import heapq
+import math
+import os
+import random
+
+
+def guillotine_instance(
+    num_stocks: int, width: int = None, height: int = None, seed=None
+) -> tuple:
+    """
+    Generate an instance with a known zero-waste packing, by recursively
+    cutting a width x height sheet into num_stocks stocks with guillotine
+    cuts. The largest piece is always cut next, across its longer side at a
+    random position, so the stocks are of similar size.
+
+    The sheet is square by default, about 100 units of area per stock.
+    Give both width and height, or neither.
+
+    Returns:
+        tuple: (width, height, pieces) pieces is a list of the (x, y, width,
+            height) stocks of the zero-waste packing, in a random order
+    """
+    if (width is None) != (height is None):
+        raise ValueError("Give both the width and the height of the sheet, or neither")
+    if width is None:
+        width = height = 10 * math.ceil(math.sqrt(num_stocks))
+    if num_stocks < 1 or num_stocks > width * height:
+        raise ValueError(f"Can't cut a {width}x{height} sheet into {num_stocks} stocks")
+    rng = random.Random(seed)
+
+    # max heap of the pieces by area, the counter keeps the order stable
+    pieces = [(-width * height, 0, (0, 0, width, height))]
+    for counter in range(1, num_stocks):
+        _, _, (x, y, w, h) = heapq.heappop(pieces)
+        if w > h or (w == h and rng.random() < 0.5):
+            cut = rng.randint(1, w - 1)  # vertical cut at x + cut
+            first, second = (x, y, cut, h), (x + cut, y, w - cut, h)
+        else:
+            cut = rng.randint(1, h - 1)  # horizontal cut at y + cut
+            first, second = (x, y, w, cut), (x, y + cut, w, h - cut)
+        heapq.heappush(pieces, (-first[2] * first[3], 2 * counter, first))
+        heapq.heappush(pieces, (-second[2] * second[3], 2 * counter + 1, second))
+
+    pieces = [piece for _, _, piece in pieces]
+    rng.shuffle(pieces)
+    return width, height, pieces
+
+
+def write_testcase(filename: str, width: int, height: int, pieces: list) -> None:
+    """
+    Write the stocks of an instance in the testcase format of benchmark.py
+    Template of the testcase file:
+        num_stocks
+        sheet_width sheet_height
+        stock_width stock_height
+        ...
+    """
+    with open(filename, "w") as f:
+        f.write(f"{len(pieces)}\n")
+        f.write(f"{width} {height}\n")
+        f.writelines(f"{w} {h}\n" for _, _, w, h in pieces)
+
+
+def write_solution(filename: str, width: int, height: int, pieces: list) -> None:
+    """
+    Write the zero-waste packing of an instance in the format of
+    Sheet.exportSheet, so it can be read back with Sheet.importSheet
+    """
+    with open(filename, "w") as f:
+        f.write(f"{width} {height}\n")
+        f.writelines(f"{x} {y} {w} {h}\n" for x, y, w, h in pieces)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate instances with a known zero-waste packing"
+    )
+    parser.add_argument(
+        "sizes", type=int, nargs="+", help="number of stocks of each instance"
+    )
+    parser.add_argument(
+        "--seeds", type=int, nargs="+", default=[0], help="seeds (default: 0)"
+    )
+    parser.add_argument("--width", type=int, help="sheet width")
+    parser.add_argument("--height", type=int, help="sheet height")
+    parser.add_argument(
+        "--output-dir", default="synthetic/", help="directory of the instances"
+    )
+    parser.add_argument(
+        "--solutions-dir",
+        help="also write the zero-waste packing of each instance there",
+    )
+    args = parser.parse_args()
+    if (args.width is None) != (args.height is None):
+        parser.error("--width and --height must be given together")
+
+    for directory in (args.output_dir, args.solutions_dir):
+        if directory and not os.path.exists(directory):
+            os.mkdir(directory)
+
+    for num_stocks in args.sizes:
+        for seed in args.seeds:
+            width, height, pieces = guillotine_instance(
+                num_stocks, args.width, args.height, seed
+            )
+            name = f"N{num_stocks}_{seed}"
+            filename = os.path.join(args.output_dir, name)
+            print(f"Generating {filename}: {width}x{height}, optimal height {height}")
+            write_testcase(filename, width, height, pieces)
+            if args.solutions_dir:
+                write_solution(
+                    os.path.join(args.solutions_dir, name), width, height, pieces
+                )
@@ -0,0 +1,227 @@
+from spatial import SortedRects
+
+
+class CutNode:
+    """
+    A region of the sheet in the guillotine cut tree.
+
+    A node is either a leaf, holding a stock or left free (waste), or it is
+    split in two by an edge-to-edge cut:
+    - "vertical": a cut along x = position, children are [left, right]
+    - "horizontal": a cut along y = position, children are [bottom, top]
+    """
+
+    __slots__ = ("x", "y", "width", "height", "stock", "cut", "position", "children")
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.stock = None
+        self.cut = None
+        self.position = None
+        self.children = []
+
+    def split(self, cut: str, position) -> tuple:
+        """
+        Split the node with a guillotine cut
+
+        Returns:
+            tuple: the two child nodes, (left, right) or (bottom, top)
+        """
+        self.cut = cut
+        self.position = position
+        if cut == "vertical":
+            first = CutNode(self.x, self.y, position - self.x, self.height)
+            second = CutNode(
+                position, self.y, self.x + self.width - position, self.height
+            )
+        else:
+            first = CutNode(self.x, self.y, self.width, position - self.y)
+            second = CutNode(
+                self.x, position, self.width, self.y + self.height - position
+            )
+        self.children = [first, second]
+        return first, second
+
+    def cuts(self):
+        """
+        Iterate over the cuts of the subtree, in the order they are made
+
+        Yields:
+            tuple: (cut, x0, y0, x1, y1) the line of each cut
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.cut is None:
+                continue
+            if node.cut == "vertical":
+                yield (
+                    "vertical",
+                    node.position,
+                    node.y,
+                    node.position,
+                    node.y + node.height,
+                )
+            else:
+                yield (
+                    "horizontal",
+                    node.x,
+                    node.position,
+                    node.x + node.width,
+                    node.position,
+                )
+            stack.extend(reversed(node.children))
+
+    def leaves(self):
+        """
+        Iterate over the leaves of the subtree: stocks and waste
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.cut is None:
+                yield node
+            stack.extend(reversed(node.children))
+
+    def to_dict(self) -> dict:
+        """
+        Convert the subtree to a json serializable dict
+        """
+        node = {"x": self.x, "y": self.y, "width": self.width, "height": self.height}
+        if self.cut is not None:
+            node["cut"] = self.cut
+            node["position"] = self.position
+            node["children"] = [child.to_dict() for child in self.children]
+        else:
+            node["stock"] = self.stock is not None
+        return node
+
+    def __repr__(self) -> str:
+        return (
+            f"CutNode(x={self.x}, y={self.y}, w={self.width}, h={self.height}, "
+            f"cut={self.cut}, position={self.position})"
+        )
+
+
+class Guillotine:
+    """
+    Guillotine free space of a sheet.
+
+    The free space is a set of disjoint free rectangles, the free leaves of
+    the cut tree. A stock is placed at the bottom-left corner of a free
+    rectangle, which is then cut in two by an edge-to-edge cut and the
+    stock cut off one of the halves, so every layout can be cut with
+    guillotine cuts only.
+
+    choice: which free rectangle a stock goes to
+        "best_area": the smallest one that fits
+        "best_short_side": the one leaving the smallest leftover side
+        "bottom_left": the lowest, then leftmost one
+    split: which cut is made first after placing a stock
+        "shorter_leftover" / "longer_leftover": cut along the shorter / longer
+            leftover side
+        "shorter_axis" / "longer_axis": cut along the shorter / longer side of
+            the free rectangle
+        "min_area" / "max_area": make the bigger free rectangle as small / as
+            large as possible
+    """
+
+    CHOICES = ("best_area", "best_short_side", "bottom_left")
+    SPLITS = (
+        "shorter_leftover",
+        "longer_leftover",
+        "shorter_axis",
+        "longer_axis",
+        "min_area",
+        "max_area",
+    )
+
+    def __init__(self, width, height, choice="best_area", split="shorter_leftover"):
+        if choice not in self.CHOICES:
+            raise ValueError(f"Unknown choice heuristic: {choice}")
+        if split not in self.SPLITS:
+            raise ValueError(f"Unknown split heuristic: {split}")
+        self.choice = choice
+        self.split = split
+
+        # the free rectangles are kept sorted by size, or by location for
+        # bottom_left. The first one that fits is the answer, except for
+        # best_short_side which looks at all of them
+        if choice == "bottom_left":
+            key = lambda node: (node.y, node.x)
+        else:
+            key = lambda node: node.width * node.height
+        self.free = SortedRects(key=key)
+
+        self.root = CutNode(0, 0, width, height)
+        self.free.add(self.root)
+
+    def find(self, width, height):
+        """
+        Find the free rectangle for a width x height stock
+
+        Returns:
+            tuple: (node, score), node is None if the stock doesn't fit.
+                The lower the score, the better the fit.
+        """
+        if self.choice != "best_short_side":
+            node = self.free.first_fit(width, height)
+            if node is None:
+                return None, None
+            return node, self.free.key(node)
+
+        best, best_score = None, None
+        for node in self.free.fits(width, height):
+            leftover = min(node.width - width, node.height - height)
+            score = (leftover, max(node.width - width, node.height - height))
+            if best is None or score < best_score:
+                best, best_score = node, score
+        return best, best_score
+
+    def _is_horizontal_first(self, node, width, height) -> bool:
+        """
+        Decide the direction of the first cut after placing a width x height
+        stock in the node
+        """
+        leftover_w = node.width - width
+        leftover_h = node.height - height
+        if self.split == "shorter_leftover":
+            return leftover_w <= leftover_h
+        if self.split == "longer_leftover":
+            return leftover_w > leftover_h
+        if self.split == "shorter_axis":
+            return node.width <= node.height
+        if self.split == "longer_axis":
+            return node.width > node.height
+        if self.split == "min_area":
+            return width * leftover_h > leftover_w * height
+        return width * leftover_h <= leftover_w * height  # max_area
+
+    def place(self, node: CutNode, stock) -> CutNode:
+        """
+        Place the stock at the bottom-left of the free node and cut it off
+
+        Returns:
+            CutNode: the leaf of the stock
+        """
+        self.free.remove(node)
+        width, height = stock.width, stock.height
+        horizontal = self._is_horizontal_first(node, width, height)
+
+        leaf = node
+        for cut in (
+            ("horizontal", "vertical") if horizontal else ("vertical", "horizontal")
+        ):
+            if cut == "horizontal" and leaf.height > height:
+                leaf, rest = leaf.split(cut, leaf.y + height)
+            elif cut == "vertical" and leaf.width > width:
+                leaf, rest = leaf.split(cut, leaf.x + width)
+            else:
+                continue  # already the size of the stock
+            self.free.add(rest)
+
+        leaf.stock = stock
+        return leaf
@@ -0,0 +1,163 @@
+"""
+Binary layout format, a compact alternative to the sheet.txt of
+Sheet.exportSheet that can be memory-mapped.
+
+    header, 32 bytes, little-endian:
+        magic       4 bytes, b"CSPL"
+        version     int32
+        width       int32, of the sheet
+        height      int32, of the sheet
+        count       int64, number of packed stocks
+        (8 bytes reserved, zero)
+    records, count x 4 int32, little-endian:
+        x y width height
+
+The records are in the column order of PackedArrays, so a file maps
+straight into one without copying.
+"""
+
+from packed_arrays import PackedArrays
+import argparse
+import numpy as np
+import struct
+
+MAGIC = b"CSPL"
+VERSION = 1
+HEADER = struct.Struct("<4siiiq8x")
+RECORD_DTYPE = np.dtype("<i4")
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+# rows converted at once by the text <-> binary converters
+CHUNK_ROWS = 1 << 20
+
+
+def _check_int32(*values) -> None:
+    for value in values:
+        if not INT32_MIN <= value <= INT32_MAX:
+            raise ValueError(f"{value} doesn't fit in an int32 record")
+
+
+def _check_rows(rows: np.ndarray) -> np.ndarray:
+    """
+    Get the rows as int32 records, the values must be integers in range
+    """
+    rows = np.asarray(rows).reshape(-1, 4)
+    if rows.dtype.kind == "f" and not np.all(rows == np.round(rows)):
+        raise ValueError("The binary layout format stores integer coordinates only")
+    if len(rows) > 0:
+        _check_int32(rows.min().item(), rows.max().item())
+    return rows.astype(RECORD_DTYPE, copy=False)
+
+
+def read_header(f) -> tuple:
+    """
+    Read the header of a binary layout file
+
+    Returns:
+        tuple: (width, height, count)
+    """
+    magic, version, width, height, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a binary layout file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary layout version: {version}")
+    return width, height, count
+
+
+def write_layout(filename: str, width: int, height: int, rows) -> None:
+    """
+    Write a layout: the sheet size and the (x, y, width, height) rows of the
+    packed stocks, an (n, 4) array-like
+    """
+    _check_int32(width, height)
+    rows = _check_rows(rows)
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, len(rows)))
+        rows.tofile(f)
+
+
+def read_layout(filename: str, mmap: bool = True) -> tuple:
+    """
+    Read a layout, memory-mapped read-only by default: the records are
+    only read from disk when they are used
+
+    Returns:
+        tuple: (width, height, arrays) arrays is a PackedArrays over the
+            records, they are copied only if it grows
+    """
+    with open(filename, "rb") as f:
+        width, height, count = read_header(f)
+        if not mmap:
+            data = np.fromfile(f, dtype=RECORD_DTYPE, count=4 * count)
+            return width, height, PackedArrays(data=data.reshape(-1, 4))
+    if count == 0:  # an empty file can't be mapped
+        data = np.empty((0, 4), dtype=RECORD_DTYPE)
+    else:
+        data = np.memmap(
+            filename,
+            dtype=RECORD_DTYPE,
+            mode="r",
+            offset=HEADER.size,
+            shape=(count, 4),
+        )
+    return width, height, PackedArrays(data=data)
+
+
+def text_to_binary(text_filename: str, binary_filename: str) -> int:
+    """
+    Convert a sheet.txt (see Sheet.exportSheet) to a binary layout, in
+    chunks of CHUNK_ROWS lines
+
+    Returns:
+        int: the number of stocks
+    """
+    count = 0
+    with open(text_filename, "r") as src, open(binary_filename, "wb") as dst:
+        width, height = map(int, src.readline().split())
+        _check_int32(width, height)
+        dst.write(HEADER.pack(MAGIC, VERSION, width, height, 0))
+        while True:
+            lines = src.readlines(CHUNK_ROWS * 16)  # about CHUNK_ROWS lines
+            if not lines:
+                break
+            rows = np.array("".join(lines).split(), dtype=np.int64)
+            if len(rows) % 4 != 0:
+                raise ValueError(f"{text_filename}: expected 4 values per line")
+            _check_rows(rows).tofile(dst)
+            count += len(rows) // 4
+        # the count is known at the end only
+        dst.seek(0)
+        dst.write(HEADER.pack(MAGIC, VERSION, width, height, count))
+    return count
+
+
+def binary_to_text(binary_filename: str, text_filename: str) -> int:
+    """
+    Convert a binary layout to a sheet.txt (see Sheet.exportSheet), in
+    chunks of CHUNK_ROWS records
+
+    Returns:
+        int: the number of stocks
+    """
+    width, height, arrays = read_layout(binary_filename)
+    with open(text_filename, "w") as f:
+        f.write(f"{width} {height}\n")
+        for start in range(0, len(arrays), CHUNK_ROWS):
+            np.savetxt(f, arrays.data[start : start + CHUNK_ROWS], fmt="%d")
+    return len(arrays)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert layouts between sheet.txt and the binary format"
+    )
+    parser.add_argument("direction", choices=["to-binary", "to-text"])
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    args = parser.parse_args()
+
+    if args.direction == "to-binary":
+        count = text_to_binary(args.src, args.dst)
+    else:
+        count = binary_to_text(args.src, args.dst)
+    print(f"Converted {count} stocks from {args.src} to {args.dst}")
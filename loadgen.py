@@ -0,0 +1,119 @@
+from benchmark import DATASET_DIR, read_testcase
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+
+async def post(reader, writer, host: str, path: str, payload: bytes) -> tuple:
+    """
+    Send a POST request on a kept alive connection
+
+    Returns:
+        tuple: (status, body)
+    """
+    writer.write(
+        (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        ).encode()
+        + payload
+    )
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, body
+
+
+async def client(host, port, payload, count, latencies, statuses) -> None:
+    """
+    Send count requests one after the other on one connection
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            status, _ = await post(reader, writer, host, "/pack", payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, payload, requests, concurrency) -> dict:
+    """
+    Send the requests from concurrency clients at once
+
+    Returns:
+        dict: the throughput (requests per second), the p50 and p99 latency
+            (in seconds) and the count of each response status
+    """
+    latencies, statuses = [], {}
+    counts = [requests // concurrency] * concurrency
+    for i in range(requests % concurrency):
+        counts[i] += 1
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client(host, port, payload, count, latencies, statuses)
+            for count in counts
+            if count > 0
+        )
+    )
+    elapsed = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+    return {
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": percentiles[98] if percentiles else latencies[0],
+        "statuses": statuses,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator of server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--testcase",
+        default=DATASET_DIR + "C1_1",
+        help="testcase file of the packing request",
+    )
+    parser.add_argument("--rotation", action="store_true")
+    args = parser.parse_args()
+
+    sheet = read_testcase(args.testcase)
+    payload = json.dumps(
+        {
+            "width": sheet.width,
+            "height": sheet.height,
+            "stocks": [[stock.width, stock.height] for stock in sheet.unpacked_stocks],
+            "rotation": args.rotation,
+        }
+    ).encode()
+
+    result = asyncio.run(
+        run_load(args.host, args.port, payload, args.requests, args.concurrency)
+    )
+    print(
+        f"{result['requests']} requests in {result['elapsed']:.2f}s, "
+        f"throughput {result['throughput']:.1f} req/s, "
+        f"p50 {result['p50'] * 1000:.2f}ms, p99 {result['p99'] * 1000:.2f}ms, "
+        f"statuses {result['statuses']}"
+    )
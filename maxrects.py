@@ -0,0 +1,157 @@
+import math
+from spatial import GridIndex, SortedRects
+
+
+class FreeRect:
+    """
+    A maximal free rectangle of the sheet
+    """
+
+    __slots__ = ("x", "y", "width", "height")
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def contains(self, rect) -> bool:
+        """
+        Check if the rectangle is fully inside this one
+        """
+        return (
+            self.x <= rect.x
+            and self.y <= rect.y
+            and rect.x + rect.width <= self.x + self.width
+            and rect.y + rect.height <= self.y + self.height
+        )
+
+    def __repr__(self) -> str:
+        return f"FreeRect(x={self.x}, y={self.y}, w={self.width}, h={self.height})"
+
+
+class MaxRects:
+    """
+    Maximal Rectangles free space of a sheet.
+
+    The free space is kept as the set of all maximal free rectangles, which
+    may overlap each other. Placing a stock splits every free rectangle it
+    overlaps into up to four maximal pieces, and pieces contained in another
+    free rectangle are pruned.
+
+    The free rectangles are indexed twice:
+    - by location (GridIndex), so a placement only splits nearby rectangles
+    - in bottom-left order (SortedRects), so finding the lowest, then
+      leftmost rectangle that fits skips the buckets that cannot hold it
+    """
+
+    # free rectangles are large, so the location grid is much coarser than
+    # the one of the packed stocks
+    GRID_CELLS = 64
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        cell_size = max(1, math.ceil(math.sqrt(width * height / self.GRID_CELLS)))
+        self.grid = GridIndex(width, height, cell_size)
+        self.free = SortedRects(key=lambda r: (r.y, r.x))
+        self._add(FreeRect(0, 0, width, height))
+
+    def _add(self, rect: FreeRect) -> None:
+        self.grid.insert(rect)
+        self.free.add(rect)
+
+    def _remove(self, rect: FreeRect) -> None:
+        self.grid.remove(rect)
+        self.free.remove(rect)
+
+    def find_position(self, width, height):
+        """
+        Find the bottom-left position for a width x height stock
+
+        Returns:
+            tuple: (x, y) of the position, None if it doesn't fit anywhere
+        """
+        rect = self.free.first_fit(width, height)
+        if rect is None:
+            return None
+        return (rect.x, rect.y)
+
+    def find_stock_position(self, stock, rotation=False):
+        """
+        Find the bottom-left position for the stock, trying it rotated by 90
+        degrees as well if rotation is allowed
+
+        Returns:
+            tuple: ((x, y), rotated), (x, y) is None if it doesn't fit anywhere
+        """
+        loc = self.find_position(stock.width, stock.height)
+        if rotation == True:
+            loc_rotated = self.find_position(stock.height, stock.width)
+            if loc_rotated is not None and (
+                loc is None
+                or (loc_rotated[1], loc_rotated[0]) < (loc[1], loc[0])
+                # same position, prefer the stock wider than it is tall
+                or (loc_rotated == loc and stock.width < stock.height)
+            ):
+                return loc_rotated, True
+        return loc, False
+
+    def place(self, x, y, width, height) -> None:
+        """
+        Mark the width x height area at (x, y) as used
+        """
+        right, top = x + width, y + height
+
+        # split the free rectangles that overlap the placed one
+        pieces = []
+        for rect in list(self.grid.query(x, y, width, height)):
+            rect_right, rect_top = rect.x + rect.width, rect.y + rect.height
+            if not (
+                x < rect_right and rect.x < right and y < rect_top and rect.y < top
+            ):
+                continue
+            self._remove(rect)
+            if x > rect.x:  # left piece
+                pieces.append(FreeRect(rect.x, rect.y, x - rect.x, rect.height))
+            if right < rect_right:  # right piece
+                pieces.append(FreeRect(right, rect.y, rect_right - right, rect.height))
+            if y > rect.y:  # bottom piece
+                pieces.append(FreeRect(rect.x, rect.y, rect.width, y - rect.y))
+            if top < rect_top:  # top piece
+                pieces.append(FreeRect(rect.x, top, rect.width, rect_top - top))
+
+        # prune the pieces that are contained in another free rectangle.
+        # The remaining free rectangles are maximal already, and a rectangle
+        # containing a piece covers its bottom-left corner
+        for i, piece in enumerate(pieces):
+            if any(
+                other.contains(piece)
+                for other in self.grid.query(piece.x, piece.y, 0, 0)
+            ):
+                continue
+            if any(
+                other.contains(piece) and (j < i or not piece.contains(other))
+                for j, other in enumerate(pieces)
+                if j != i
+            ):
+                continue  # duplicates: only the first one is kept
+            self._add(piece)
+
+    def getFreeRectangles(self) -> list:
+        """
+        Get the free rectangles as (x, y, width, height) tuples
+        """
+        return [(r.x, r.y, r.width, r.height) for r in self.free]
+
+    def getMaxFreeWidth(self):
+        """
+        Get the width of the widest free rectangle
+        """
+        return self.free.getMaxWidth()
+
+    def getMaxFreeHeight(self):
+        """
+        Get the height of the tallest free rectangle
+        """
+        return self.free.getMaxHeight()
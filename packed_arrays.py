@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class PackedArrays:
+    """
+    Structure-of-arrays storage for packed stocks.
+    The x, y, width and height of every stock are kept as columns of one
+    growable (capacity, 4) NumPy array, so geometric questions about the
+    whole pattern can be answered with vectorized operations.
+    """
+
+    X, Y, W, H = range(4)
+    # max number of (candidate, stock) pairs compared at once
+    CHUNK_PAIRS = 1 << 20
+
+    def __init__(self, capacity: int = 64, dtype=np.int64, data=None):
+        """
+        Args:
+            capacity: initial number of rows
+            dtype: dtype of the coordinates
+            data: an existing (n, 4) array to adopt without copying, e.g.
+                a memory-mapped file. It is copied only when it has to grow.
+        """
+        if data is not None:
+            self.data = data
+            self.size = len(data)
+        else:
+            self.data = np.empty((max(1, capacity), 4), dtype=dtype)
+            self.size = 0
+
+    def append(self, x, y, width, height) -> None:
+        """
+        Append a stock, doubling the capacity when full
+        """
+        if self.data.dtype.kind != "f" and not all(
+            isinstance(v, (int, np.integer)) for v in (x, y, width, height)
+        ):
+            # fractional coordinates, don't truncate them
+            self.data = self.data.astype(np.float64)
+        if self.size == len(self.data):
+            data = np.empty((max(1, 2 * len(self.data)), 4), dtype=self.data.dtype)
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        self.data[self.size] = (x, y, width, height)
+        self.size += 1
+
+    def extend(self, rows) -> None:
+        """
+        Append many (x, y, width, height) rows at once
+        """
+        rows = np.asarray(rows, dtype=self.data.dtype).reshape(-1, 4)
+        needed = self.size + len(rows)
+        if needed > len(self.data):
+            capacity = max(needed, 2 * len(self.data))
+            data = np.empty((capacity, 4), dtype=self.data.dtype)
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        self.data[self.size : needed] = rows
+        self.size = needed
+
+    @property
+    def x(self):
+        return self.data[: self.size, self.X]
+
+    @property
+    def y(self):
+        return self.data[: self.size, self.Y]
+
+    @property
+    def width(self):
+        return self.data[: self.size, self.W]
+
+    @property
+    def height(self):
+        return self.data[: self.size, self.H]
+
+    def getLowerBoundHeight(self):
+        """
+        Get the maximum y + height of the packed stocks
+        """
+        return (self.y + self.height).max().item()
+
+    def getAreaUsed(self):
+        """
+        Get the sum of the areas of the packed stocks
+        """
+        # at least int64, the records of a binary layout are int32
+        dtype = np.result_type(self.data.dtype, np.int64)
+        return np.multiply(self.width, self.height, dtype=dtype).sum().item()
+
+    def intersects_any(self, locs, width, height):
+        """
+        Check, for each (x, y) in locs, whether a width x height stock placed
+        there intersects any of the stored stocks.
+
+        Returns:
+            np.ndarray: boolean array, one entry per location
+        """
+        locs = np.asarray(locs).reshape(-1, 2)
+        result = np.zeros(len(locs), dtype=bool)
+        if self.size == 0 or len(locs) == 0:
+            return result
+
+        x2, y2, w2, h2 = self.x, self.y, self.width, self.height
+        # compare the candidates in chunks to keep the (k, n) masks bounded
+        step = max(1, self.CHUNK_PAIRS // self.size)
+        for start in range(0, len(locs), step):
+            x = locs[start : start + step, 0, None]
+            y = locs[start : start + step, 1, None]
+            overlap = (
+                (x < x2 + w2) & (x + width > x2) & (y < y2 + h2) & (y + height > y2)
+            )
+            result[start : start + step] = overlap.any(axis=1)
+        return result
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,162 @@
+from stock import Stock
+from spatial import PersistentGridIndex
+from algorithm import BLF_legacy_step
+import math
+
+
+class PackingState:
+    """
+    The state of a Bottom Left Fill packing over the legacy available
+    rectangles (see algorithm.BLF_legacy_step): the packed stocks, the
+    position in the packing order and the available rectangles.
+
+    A state can be forked in O(1) and both go on packing on their own: the
+    available rectangles are a tuple, replaced after each step, the packed
+    stocks a linked list sharing its tail, and the occupancy index is
+    copy-on-write (see spatial.PersistentGridIndex).
+
+    The stocks are packed as new Stock objects, tagged with the index of
+    the stock they stand for, the caller's stocks are never touched.
+    """
+
+    def __init__(self, width, height, cell_size=None):
+        self.width = width
+        self.height = height
+        self.available_rectangles = ((0, 0, width, height),)
+        self.packed = None  # (stock index, Stock, next), newest first
+        self.num_packed = 0
+        self.position = 0  # number of stocks of the order tried so far
+        self.area_used = 0
+        self.lower_bound_height = 0
+        self.index = PersistentGridIndex(width, height, cell_size)
+        self._packing = None  # index of the stock being packed
+
+    def fork(self) -> "PackingState":
+        """
+        Get a copy of the state, both can be packed further independently
+        """
+        other = PackingState.__new__(PackingState)
+        other.__dict__.update(self.__dict__)
+        other.index = self.index.fork()
+        return other
+
+    def validate_pack_step(self, stock: Stock, loc: tuple) -> bool:
+        """
+        Same as Sheet.validate_pack_step
+        """
+        x, y = loc
+        if (
+            x < 0
+            or y < 0
+            or x + stock.width > self.width
+            or y + stock.height > self.height
+        ):
+            return False
+        return not self.index.intersects(Stock(stock.width, stock.height, x, y))
+
+    def pack(self, stock: Stock, loc: tuple) -> bool:
+        """
+        Same as Sheet.pack, the stock must not be used anywhere else
+        """
+        if not self.validate_pack_step(stock, loc):
+            return False
+        stock.setLoc(loc)
+        self.index.insert(stock)
+        self.packed = (self._packing, stock, self.packed)
+        self.num_packed += 1
+        self.area_used += stock.getArea()
+        self.lower_bound_height = max(self.lower_bound_height, stock.y + stock.height)
+        return True
+
+    def step(self, i: int, width, height, rotation=False) -> bool:
+        """
+        Pack the next stock of the order: the stock of index i, width x height
+
+        Returns:
+            bool: True if the stock was packed
+        """
+        self._packing = i
+        is_packed, available_rectangles = BLF_legacy_step(
+            self, list(self.available_rectangles), Stock(width, height), rotation
+        )
+        self.available_rectangles = tuple(available_rectangles)
+        self.position += 1
+        return is_packed
+
+    def getPlacements(self) -> list:
+        """
+        Get the packed stocks as (stock index, x, y, width, height), in the
+        order they were packed
+        """
+        placements = []
+        node = self.packed
+        while node is not None:
+            i, stock, node = node
+            placements.append((i, stock.x, stock.y, stock.width, stock.height))
+        placements.reverse()
+        return placements
+
+
+class IncrementalBLF:
+    """
+    Bottom Left Fill of the same stocks in many orders. Each order resumes
+    from a checkpoint of the previous one, so only the stocks from the
+    first position where the two orders differ are packed again.
+
+    A checkpoint (a fork of the state) is kept every interval positions of
+    the last order packed. The packings are the same as bin_packing_BLF
+    with the "legacy" free space.
+    """
+
+    def __init__(self, width, height, sizes: list, rotation=False, interval=1):
+        """
+        Args:
+            width, height: size of the sheet
+            sizes: (width, height) of each stock
+            rotation: whether the stocks can be rotated by 90 degrees by BLF
+            interval: number of positions between two checkpoints
+        """
+        self.sizes = sizes
+        self.rotation = rotation
+        self.interval = interval
+        # about one cell of the occupancy index per stock
+        cells = max(PersistentGridIndex.TARGET_CELLS, len(sizes))
+        cell_size = max(1, math.ceil(math.sqrt(width * height / cells)))
+        self.checkpoints = [PackingState(width, height, cell_size)]
+        self.steps = []  # (stock index, rotated) of the last order packed
+
+    def pack(self, order: list, rotated: list = None) -> PackingState:
+        """
+        Pack the stocks in the given order
+
+        Args:
+            order: the stock indices, in packing order
+            rotated: for each stock index, whether it's rotated before packing
+
+        Returns:
+            PackingState: the state after the whole order
+        """
+        steps = [(i, bool(rotated and rotated[i])) for i in order]
+        same = 0
+        while same < min(len(steps), len(self.steps)) and (
+            steps[same] == self.steps[same]
+        ):
+            same += 1
+
+        # resume from the last checkpoint before the first difference
+        k = same // self.interval
+        del self.checkpoints[k + 1 :]
+        state = self.checkpoints[k].fork()
+        try:
+            for position in range(k * self.interval, len(steps)):
+                i, is_rotated = steps[position]
+                width, height = self.sizes[i]
+                if is_rotated:
+                    width, height = height, width
+                state.step(i, width, height, self.rotation)
+                if (position + 1) % self.interval == 0:
+                    self.checkpoints.append(state.fork())
+        finally:
+            # the order the checkpoints were made for, even if a step failed
+            self.steps = steps[: (len(self.checkpoints) - 1) * self.interval]
+        return state
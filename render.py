@@ -0,0 +1,137 @@
+from stock import Sheet
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import io
+import os
+
+OUTPUT_DIR = "output/"
+
+
+def draw_sheet(sheet: Sheet, filename: str) -> None:
+    from visualization import VisualSheet
+
+    VisualSheet(sheet, batched=True).draw(unpacked=False, save=True, filename=filename)
+
+
+def draw_sheet_basic(sheet: Sheet, filename: str) -> None:
+    from visualization import VisualSheet
+
+    # a basic sheet with no text or color
+    VisualSheet(sheet, is_txt=False, fillcolor="white", batched=True).draw(
+        unpacked=False, save=True, filename=filename
+    )
+
+
+def draw_thumbnail(sheet: Sheet, filename: str) -> None:
+    from thumbnail import save_thumbnail
+
+    save_thumbnail(sheet, filename)
+
+
+def write_gcode(sheet: Sheet, filename: str) -> None:
+    sheet.to_gcode(filename)
+
+
+# the files rendered from sheet.txt, filename -> function(sheet, filename)
+RENDERS = {
+    "sheet.png": draw_sheet,
+    "sheet_basic.png": draw_sheet_basic,
+    "sheet_thumb.png": draw_thumbnail,
+    "sheet.gcode": write_gcode,
+}
+
+
+def is_up_to_date(target: str, source: str) -> bool:
+    """
+    Check if the target file exists and is newer than the source file
+    """
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(
+        source
+    )
+
+
+def render_testcase(path: str, force: bool = False) -> tuple:
+    """
+    Render the images and the gcode of a packed testcase from its sheet.txt,
+    skipping the files that are already up to date
+
+    Args:
+        path: directory of the testcase, with the sheet.txt
+        force: render every file, even if it's up to date
+
+    Returns:
+        tuple: (rendered, log) the filenames rendered, and what was printed
+    """
+    source = os.path.join(path, "sheet.txt")
+    todo = [
+        name
+        for name in RENDERS
+        if force or not is_up_to_date(os.path.join(path, name), source)
+    ]
+    log = io.StringIO()
+    if todo:
+        with contextlib.redirect_stdout(log):
+            sheet = Sheet.importSheet(source)
+            for name in todo:
+                RENDERS[name](sheet, os.path.join(path, name))
+    return todo, log.getvalue()
+
+
+def render_all(paths: list, workers: int = 1, force: bool = False) -> dict:
+    """
+    Render every testcase, in a pool of worker processes if workers > 1
+
+    Returns:
+        dict: path -> the filenames rendered
+    """
+    results = {}
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            rendered = executor.map(render_testcase, paths, [force] * len(paths))
+        else:
+            rendered = map(render_testcase, paths, [force] * len(paths))
+
+        for path, (todo, log) in zip(paths, rendered):
+            print(f"----{path}----")
+            print(log, end="")
+            print(f"Rendered: {todo}" if todo else "Up to date")
+            results[path] = todo
+    return results
+
+
+def find_testcases(output_dir: str = OUTPUT_DIR) -> list:
+    """
+    Find the testcase directories with a sheet.txt in the output directory
+    """
+    return [
+        os.path.join(output_dir, name)
+        for name in sorted(os.listdir(output_dir))
+        if os.path.exists(os.path.join(output_dir, name, "sheet.txt"))
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render the images and the gcode of packed sheets"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="testcase directories with a sheet.txt (default: all in output/)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes (default: 1, serial)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="render every file, even the ones that are up to date",
+    )
+    args = parser.parse_args()
+
+    render_all(args.paths or find_testcases(), args.workers, args.force)
@@ -0,0 +1,218 @@
+from stock import Stock, Sheet
+from algorithm import bin_packing_BLF
+from packing_state import IncrementalBLF
+from bounds import strip_height_bound
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import random
+import time
+
+# the instance evaluated by this process, set by _init_worker
+_instance = None
+# packs the legacy candidates of this process, from the previous candidate
+_incremental = None
+
+
+def _init_worker(width, height, sizes, free_space) -> None:
+    global _instance, _incremental
+    _instance = (width, height, sizes, free_space)
+    _incremental = None
+    if free_space == "legacy":
+        _incremental = IncrementalBLF(width, height, sizes)
+
+
+def evaluate(candidate: tuple) -> tuple:
+    """
+    Pack the instance of this process with bin_packing_BLF, in the order
+    and with the rotations of the candidate
+
+    Args:
+        candidate: (order, rotated) order is a permutation of the stock
+            indices, rotated tells for each stock index if it's rotated
+
+    Returns:
+        tuple: (score, placements) the lower the score the better,
+            placements are the (index, x, y) of the packed stocks
+    """
+    width, height, sizes, free_space = _instance
+    order, rotated = candidate
+    if _incremental is not None:
+        state = _incremental.pack(order, rotated)
+        placements = [(i, x, y) for i, x, y, _, _ in state.getPlacements()]
+        return (-state.area_used, state.lower_bound_height), placements
+
+    stocks = []
+    for i, (w, h) in enumerate(sizes):
+        stocks.append(Stock(h, w) if rotated[i] else Stock(w, h))
+    sheet = Sheet(width, height, list(stocks))
+    bin_packing_BLF(sheet, free_space=free_space, order=[stocks[i] for i in order])
+
+    index = {id(stock): i for i, stock in enumerate(stocks)}
+    placements = [(index[id(s)], s.x, s.y) for s in sheet.packed_stocks]
+    score = (-sheet.getAreaUsed(), sheet.getLowerBoundHeight())
+    return score, placements
+
+
+def _order_crossover(rng, parent1, parent2) -> list:
+    """
+    Order crossover (OX): a slice of the first parent, the rest of the
+    stocks in the order of the second parent
+    """
+    n = len(parent1)
+    i, j = sorted(rng.sample(range(n + 1), 2))
+    middle = list(parent1[i:j])
+    taken = set(middle)
+    rest = [gene for gene in parent2 if gene not in taken]
+    return rest[:i] + middle + rest[i:]
+
+
+def _mutate(rng, order, rotated, rotation, rate) -> tuple:
+    """
+    Swap two stocks of the order and flip the rotation of a stock, each
+    with the given rate
+    """
+    order, rotated = list(order), list(rotated)
+    n = len(order)
+    if n > 1 and rng.random() < rate:
+        i, j = rng.sample(range(n), 2)
+        order[i], order[j] = order[j], order[i]
+    if rotation and n > 0 and rng.random() < rate:
+        i = rng.randrange(n)
+        rotated[i] = not rotated[i]
+    return tuple(order), tuple(rotated)
+
+
+def _initial_orders(sizes) -> list:
+    """
+    The usual sorting rules of the stocks, the first one is the order of
+    bin_packing_BLF (descending height)
+    """
+    indices = range(len(sizes))
+    rules = [
+        lambda i: sizes[i][1],  # height
+        lambda i: sizes[i][0] * sizes[i][1],  # area
+        lambda i: sizes[i][0],  # width
+        lambda i: sizes[i][0] + sizes[i][1],  # perimeter
+        lambda i: max(sizes[i]),  # longer side
+    ]
+    return [tuple(sorted(indices, key=rule, reverse=True)) for rule in rules]
+
+
+def search_ordering(
+    sheet: Sheet,
+    method: str = "genetic",
+    rotation: bool = False,
+    iterations: int = 1000,
+    time_limit: float = None,
+    population: int = 32,
+    mutation_rate: float = 0.3,
+    workers: int = 1,
+    seed: int = 0,
+    free_space: str = "legacy",
+) -> Sheet:
+    """
+    Search over the packing orders (and rotations) of the unpacked stocks of
+    the sheet, each candidate packed with bin_packing_BLF. The candidates
+    are evaluated in batches of population, in a pool of worker processes
+    if workers > 1, and the best one is packed into the sheet.
+
+    The best candidate packs the most area, then reaches the lowest height.
+    The search stops early once a candidate packs every stock at the strip
+    height lower bound (see bounds.strip_height_bound), it's optimal.
+
+    :param method: "genetic": a genetic algorithm with order crossover
+        "multistart": random restarts, random orders and rotations
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param iterations: budget of candidates, a candidate seen before is
+        counted but not packed again
+    :param time_limit: budget in seconds, checked after each batch
+    :param seed: seed of the search. With no time_limit the result doesn't
+        depend on the number of workers
+    :return: the sheet, with the stocks of the best candidate packed
+    """
+    if method not in ("genetic", "multistart"):
+        raise ValueError(f"Unknown search method: {method}")
+    rng = random.Random(seed)
+    stocks = list(sheet.unpacked_stocks)
+    sizes = [(stock.width, stock.height) for stock in stocks]
+    n = len(stocks)
+    start = time.perf_counter()
+    # the score of an optimal candidate, no other one can do better
+    optimal = (
+        -sum(w * h for w, h in sizes),
+        strip_height_bound(sheet.width, sizes, rotation),
+    )
+
+    def out_of_budget(evaluated) -> bool:
+        if evaluated >= iterations:
+            return True
+        return time_limit is not None and time.perf_counter() - start > time_limit
+
+    def random_candidate() -> tuple:
+        order = list(range(n))
+        rng.shuffle(order)
+        rotated = tuple(rotation and rng.random() < 0.5 for _ in range(n))
+        return tuple(order), rotated
+
+    no_rotation = (False,) * n
+    batch = [(order, no_rotation) for order in _initial_orders(sizes)]
+    batch = batch[: max(1, min(population, iterations))]
+
+    best = None  # (score, placements, candidate)
+    scores = {}  # candidate -> score, the same candidate is packed once
+    ranked = []  # the (score, candidate) of the current population, best first
+    evaluated = 0
+    with contextlib.ExitStack() as stack:
+        initargs = (sheet.width, sheet.height, sizes, free_space)
+        if workers > 1:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(
+                    workers, initializer=_init_worker, initargs=initargs
+                )
+            )
+            evaluate_all = lambda batch: executor.map(evaluate, batch, chunksize=4)
+        else:
+            _init_worker(*initargs)
+            evaluate_all = lambda batch: map(evaluate, batch)
+
+        while True:
+            # sorted, the candidates packed one after the other by a worker
+            # share long prefixes, see IncrementalBLF
+            new = sorted(c for c in set(batch) if c not in scores)
+            for candidate, (score, placements) in zip(new, evaluate_all(new)):
+                scores[candidate] = score
+                if best is None or score < best[0]:
+                    best = (score, placements, candidate)
+            ranked.extend((scores[candidate], candidate) for candidate in batch)
+            evaluated += len(batch)
+            if out_of_budget(evaluated) or best[0] <= optimal:
+                break
+
+            size = min(population, iterations - evaluated)
+            if method == "multistart":
+                ranked = []
+                batch = [random_candidate() for _ in range(size)]
+                continue
+
+            # next generation: keep the best half, breed the rest
+            ranked.sort(key=lambda scored: scored[0])
+            ranked = ranked[: max(2, population // 2)]
+            batch = []
+            for _ in range(size):
+                # tournament selection of the parents
+                parent1 = min(rng.sample(ranked, min(3, len(ranked))))[1]
+                parent2 = min(rng.sample(ranked, min(3, len(ranked))))[1]
+                order = _order_crossover(rng, parent1[0], parent2[0])
+                rotated = tuple(
+                    parent1[1][i] if rng.random() < 0.5 else parent2[1][i]
+                    for i in range(n)
+                )
+                batch.append(_mutate(rng, order, rotated, rotation, mutation_rate))
+
+    # pack the best candidate into the sheet
+    score, placements, (order, rotated) = best
+    for i in range(n):
+        if rotated[i]:
+            stocks[i].rotate90()
+    sheet.packStocks([(stocks[i], (x, y)) for i, x, y in placements])
+    return sheet
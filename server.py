@@ -0,0 +1,302 @@
+from stock import Stock, Sheet
+from algorithm import bin_packing_BLF
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import json
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    504: "Gateway Timeout",
+}
+
+# the largest request body read, in bytes
+MAX_BODY_SIZE = 1 << 20
+
+
+def _is_positive_int(value) -> bool:
+    # bool is a subclass of int, but true isn't a size
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def parse_request(request: dict) -> dict:
+    """
+    Check a packing request and fill in its defaults
+    Template of a request:
+        {"width": 20, "height": 20, "stocks": [[4, 1], [4, 5], ...],
+         "rotation": false, "free_space": "legacy"}
+
+    Raises:
+        ValueError: if the request is malformed
+    """
+    if not isinstance(request, dict):
+        raise ValueError("The request must be a json object")
+    for field in ("width", "height"):
+        if not _is_positive_int(request.get(field)):
+            raise ValueError(f"{field} must be a positive integer")
+    stocks = request.get("stocks")
+    if not isinstance(stocks, list) or not all(
+        isinstance(stock, list)
+        and len(stock) == 2
+        and all(_is_positive_int(side) for side in stock)
+        for stock in stocks
+    ):
+        raise ValueError("stocks must be a list of [width, height] positive integers")
+    rotation = request.get("rotation", False)
+    if not isinstance(rotation, bool):
+        raise ValueError("rotation must be a boolean")
+    free_space = request.get("free_space", "legacy")
+    if free_space not in ("legacy", "maxrects"):
+        raise ValueError(f"Unknown free space strategy: {free_space}")
+    return {
+        "width": request["width"],
+        "height": request["height"],
+        "stocks": stocks,
+        "rotation": rotation,
+        "free_space": free_space,
+    }
+
+
+def pack_request(request: dict) -> dict:
+    """
+    Pack a request with bin_packing_BLF
+
+    Returns:
+        dict: {"placements": [[stock, x, y, width, height], ...],
+            "unpacked": [stock, ...], "stats": Sheet.getStats()}, stock is
+            the index of the stock in the request
+    """
+    stocks = [Stock(width, height) for width, height in request["stocks"]]
+    sheet = Sheet(request["width"], request["height"], list(stocks))
+    bin_packing_BLF(
+        sheet, rotation=request["rotation"], free_space=request["free_space"]
+    )
+    index = {id(stock): i for i, stock in enumerate(stocks)}
+    return {
+        "placements": [
+            [index[id(s)], s.x, s.y, s.width, s.height] for s in sheet.packed_stocks
+        ],
+        "unpacked": sorted(index[id(s)] for s in sheet.unpacked_stocks),
+        "stats": sheet.getStats(),
+    }
+
+
+def pack_batch(requests: list) -> list:
+    """
+    Pack a batch of requests in a worker process, an error only fails its
+    own request
+    """
+    results = []
+    for request in requests:
+        try:
+            results.append(pack_request(request))
+        except Exception as e:
+            results.append({"error": f"{type(e).__name__}: {e}"})
+    return results
+
+
+class PackingServer:
+    """
+    HTTP/JSON packing service.
+
+    POST /pack takes a packing request (see parse_request) and answers with
+    the packing (see pack_request). GET /health answers {"status": "ok"}.
+
+    The requests are queued and grouped into batches of up to batch_size,
+    waiting at most batch_delay seconds for a batch to fill up. Each batch
+    is packed in a process pool, with at most 2 batches per worker in
+    flight, the rest wait in the queue and make the next batches bigger.
+    A request not answered within timeout seconds gets a 504, its batch
+    still runs to the end in the pool. A body larger than max_body_size
+    bytes gets a 413 and the connection is closed, without reading it.
+    """
+
+    def __init__(
+        self,
+        workers=2,
+        batch_size=8,
+        batch_delay=0.005,
+        timeout=10.0,
+        max_body_size=MAX_BODY_SIZE,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self.queue = None
+        self.executor = None
+
+    async def serve(self, host="127.0.0.1", port=8080) -> None:
+        """
+        Run the server until cancelled
+        """
+        self.queue = asyncio.Queue()
+        self.in_flight = asyncio.Semaphore(2 * self.workers)
+        with ProcessPoolExecutor(max_workers=self.workers) as self.executor:
+            batcher = asyncio.create_task(self._batcher())
+            server = await asyncio.start_server(self._handle, host, port)
+            print(f"Serving on http://{host}:{port}")
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                batcher.cancel()
+
+    async def submit(self, request: dict) -> dict:
+        """
+        Queue a request for packing and wait for its result
+
+        Raises:
+            asyncio.TimeoutError: if it takes longer than the timeout
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((request, future))
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # the requests that timed out while queued are not packed
+            batch = [
+                (request, future) for request, future in batch if not future.done()
+            ]
+            if not batch:
+                continue
+            await self.in_flight.acquire()
+            job = loop.run_in_executor(
+                self.executor, pack_batch, [request for request, _ in batch]
+            )
+            job.add_done_callback(lambda job, batch=batch: self._answer(job, batch))
+
+    def _answer(self, job, batch) -> None:
+        self.in_flight.release()
+        if job.exception() is not None:
+            results = [{"error": str(job.exception())}] * len(batch)
+        else:
+            results = job.result()
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # timed out already
+                future.set_result(result)
+
+    async def _handle(self, reader, writer) -> None:
+        """
+        Answer the HTTP requests of a connection, kept alive until the
+        client closes it
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if not 0 <= length <= self.max_body_size:
+                    error = f"The body must be at most {self.max_body_size} bytes"
+                    await self._respond(writer, 413, {"error": error})
+                    break  # the body is left unread
+                body = await reader.readexactly(length)
+
+                status, response = await self._route(method, path, body)
+                await self._respond(writer, status, response)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # the client went away, or it isn't speaking HTTP
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status: int, response: dict) -> None:
+        payload = json.dumps(response).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode() + payload)
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple:
+        """
+        Returns:
+            tuple: (status, json response)
+        """
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path != "/pack":
+            return 404, {"error": f"Unknown path: {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        try:
+            request = parse_request(json.loads(body))
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            return 400, {"error": str(e)}
+        try:
+            result = await self.submit(request)
+        except asyncio.TimeoutError:
+            return 504, {"error": f"Packing took longer than {self.timeout}s"}
+        if "error" in result:
+            return 500, result
+        return 200, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/JSON packing service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2, help="worker processes")
+    parser.add_argument(
+        "--batch-size", type=int, default=8, help="max requests per batch"
+    )
+    parser.add_argument(
+        "--batch-delay",
+        type=float,
+        default=0.005,
+        help="max seconds to wait for a batch to fill up",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=10.0, help="seconds per request"
+    )
+    parser.add_argument(
+        "--max-body-size",
+        type=int,
+        default=MAX_BODY_SIZE,
+        help=f"max bytes of a request body (default: {MAX_BODY_SIZE})",
+    )
+    args = parser.parse_args()
+
+    server = PackingServer(
+        args.workers,
+        args.batch_size,
+        args.batch_delay,
+        args.timeout,
+        args.max_body_size,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,155 @@
+from stock import Stock, Sheet
+from maxrects import MaxRects
+from spatial import SortedRects
+
+
+class OpenSheet:
+    """
+    A sheet of the pool, with its free space
+    """
+
+    def __init__(self, number: int, sheet: Sheet, pool: "SheetPool"):
+        self.number = number
+        self.sheet = sheet
+        self.free_area = sheet.getArea()
+        self.placements = []  # (stock, (x, y)), packed into the sheet on close
+        self.free_space = _PoolMaxRects(sheet.width, sheet.height, pool, self)
+
+
+class _PoolMaxRects(MaxRects):
+    """
+    MaxRects that also keeps its free rectangles in the index of the pool
+    """
+
+    def __init__(self, width, height, pool: "SheetPool", open_sheet: OpenSheet):
+        self.pool = pool
+        self.open_sheet = open_sheet
+        super().__init__(width, height)
+
+    def _add(self, rect) -> None:
+        super()._add(rect)
+        self.pool._add_free(rect, self.open_sheet)
+
+    def _remove(self, rect) -> None:
+        super()._remove(rect)
+        self.pool._remove_free(rect)
+
+
+class SheetPool:
+    """
+    A pool of identical sheets, opened on demand.
+
+    The free rectangles of all the open sheets are kept in one SortedRects,
+    keyed by their sheet and then their bottom-left position. The sheet
+    part of the key is:
+    - "first": the order the sheets were opened in, first fit
+    - "best": the free area of the sheet, best fit (the fullest that fits)
+    so the first free rectangle that holds a stock is both the sheet to use
+    and the position in it. The search skips every bucket of free
+    rectangles that can't hold the stock, instead of trying every sheet.
+    """
+
+    FITS = ("first", "best")
+
+    def __init__(self, width, height, fit="first", rotation=False):
+        if fit not in self.FITS:
+            raise ValueError(f"Unknown fit: {fit}")
+        self.width = width
+        self.height = height
+        self.fit = fit
+        self.rotation = rotation
+        self.owners = {}  # id(free rectangle) -> OpenSheet
+        self.free = SortedRects(key=self._key)
+        self.opened = []  # every OpenSheet, in the order they were opened
+
+    def _key(self, rect):
+        open_sheet = self.owners[id(rect)]
+        if self.fit == "first":
+            return (open_sheet.number, rect.y, rect.x)
+        return (open_sheet.free_area, open_sheet.number, rect.y, rect.x)
+
+    def _add_free(self, rect, open_sheet: OpenSheet) -> None:
+        self.owners[id(rect)] = open_sheet
+        self.free.add(rect)
+
+    def _remove_free(self, rect) -> None:
+        self.free.remove(rect)
+        del self.owners[id(rect)]
+
+    def _fits_empty_sheet(self, stock: Stock) -> bool:
+        if stock.width <= self.width and stock.height <= self.height:
+            return True
+        return self.rotation and (
+            stock.height <= self.width and stock.width <= self.height
+        )
+
+    def _open(self) -> OpenSheet:
+        open_sheet = OpenSheet(len(self.opened), Sheet(self.width, self.height), self)
+        self.opened.append(open_sheet)
+        return open_sheet
+
+    def _find(self, stock: Stock):
+        """
+        Find the first free rectangle that holds the stock
+
+        Returns:
+            tuple: (free rectangle, rotated), the rectangle is None if the
+                stock doesn't fit any open sheet
+        """
+        rect = self.free.first_fit(stock.width, stock.height)
+        if self.rotation == True and stock.width != stock.height:
+            rect_rotated = self.free.first_fit(stock.height, stock.width)
+            if rect_rotated is not None:
+                if rect is None:
+                    return rect_rotated, True
+                key, key_rotated = self._key(rect), self._key(rect_rotated)
+                if key_rotated < key or (
+                    # same position, prefer the stock wider than it is tall
+                    key_rotated == key
+                    and stock.width < stock.height
+                ):
+                    return rect_rotated, True
+        return rect, False
+
+    def add(self, stock: Stock) -> bool:
+        """
+        Place the stock into the first (or best) open sheet where it fits,
+        opening a new sheet if needed
+
+        Returns:
+            bool: False if the stock doesn't fit even an empty sheet
+        """
+        if not self._fits_empty_sheet(stock):
+            return False
+
+        rect, rotated = self._find(stock)
+        if rect is None:
+            self._open()
+            rect, rotated = self._find(stock)
+        open_sheet = self.owners[id(rect)]
+
+        if rotated:
+            stock.rotate90()
+        loc = (rect.x, rect.y)
+        open_sheet.free_space.place(loc[0], loc[1], stock.width, stock.height)
+        open_sheet.placements.append((stock, loc))
+        open_sheet.free_area -= stock.getArea()
+
+        if self.fit == "best":
+            # the free area is part of the key of every free rectangle
+            for rect in list(open_sheet.free_space.free):
+                self.free.remove(rect)
+                self.free.add(rect)
+        return True
+
+    def close(self) -> list:
+        """
+        Pack the placed stocks into their sheets
+
+        Returns:
+            list: the sheets, in the order they were opened
+        """
+        for open_sheet in self.opened:
+            open_sheet.sheet.packStocks(open_sheet.placements)
+            open_sheet.placements = []
+        return [open_sheet.sheet for open_sheet in self.opened]
@@ -0,0 +1,73 @@
+import math
+from bisect import bisect_left
+
+
+class Shelves:
+    """
+    Shelves of a sheet, for packing stocks online in the order they come.
+
+    The sheet is filled bottom-up with shelves, rows of stocks left to
+    right. Each shelf has a height class: the heights ceil(height * ratio^k)
+    for k = 0, 1, ... down to 1. A stock goes to the open shelf of the
+    smallest class at least as tall as the stock, so a shelf wastes less
+    than 1 - ratio of its height over each stock.
+
+    Only the last shelf of each class is open, the others are never looked
+    at again: the memory is O(log height) and so is placing a stock.
+    """
+
+    def __init__(self, width, height, ratio=0.8):
+        if not 0 < ratio < 1:
+            raise ValueError(f"The ratio must be in (0, 1): {ratio}")
+        self.width = width
+        self.height = height
+        # the class heights, ascending
+        heights = set()
+        shelf_height = height
+        while shelf_height > 1:
+            heights.add(shelf_height)
+            shelf_height = min(shelf_height - 1, math.ceil(shelf_height * ratio))
+        heights.add(1)
+        self.class_heights = sorted(heights)
+        self.open = {}  # class height -> [x, y, height] of its open shelf
+        self.top = 0  # where the next shelf starts
+
+    def place(self, width, height):
+        """
+        Place a width x height stock
+
+        Returns:
+            tuple: (x, y) of the stock, None if it doesn't fit
+        """
+        if width > self.width or height > self.height:
+            return None
+        i = bisect_left(self.class_heights, height)
+        class_height = self.class_heights[i]
+
+        shelf = self.open.get(class_height)
+        if shelf is None or shelf[0] + width > self.width or height > shelf[2]:
+            if self.top + height > self.height:
+                # no room for a new shelf, try the taller open shelves
+                return self._place_taller(i, width, height)
+            # open a new shelf, the last one may be cut by the top of the sheet
+            shelf_height = min(class_height, self.height - self.top)
+            shelf = [0, self.top, shelf_height]
+            self.open[class_height] = shelf
+            self.top += shelf_height
+
+        loc = (shelf[0], shelf[1])
+        shelf[0] += width
+        return loc
+
+    def _place_taller(self, i, width, height):
+        """
+        Place a stock into the first open shelf of a taller class with room
+        """
+        for class_height in self.class_heights[i:]:
+            shelf = self.open.get(class_height)
+            if shelf is not None and shelf[0] + width <= self.width:
+                if height <= shelf[2]:
+                    loc = (shelf[0], shelf[1])
+                    shelf[0] += width
+                    return loc
+        return None
@@ -0,0 +1,121 @@
+class Skyline:
+    """
+    Skyline of a sheet: the height of the packed stocks over every integer
+    x coordinate in [0, width).
+
+    The heights are kept in a segment tree with lazy range assignment, so
+    finding the lowest gap of the skyline and raising a range of it both
+    take O(log width).
+    """
+
+    def __init__(self, width: int, height: int = 0):
+        self.width = width
+        size = 1
+        while size < width:
+            size *= 2
+        self.size = size
+        # the padding leaves past the width are walls of infinite height
+        inf = float("inf")
+        self.min = [inf] * (2 * size)  # min height in the node range
+        self.max = [inf] * (2 * size)  # max height in the node range
+        self.lazy = [None] * (2 * size)  # pending assignment of the node range
+        for x in range(width):
+            self.min[size + x] = self.max[size + x] = height
+        for node in range(size - 1, 0, -1):
+            self._pull(node)
+
+    def _pull(self, node) -> None:
+        self.min[node] = min(self.min[2 * node], self.min[2 * node + 1])
+        self.max[node] = max(self.max[2 * node], self.max[2 * node + 1])
+
+    def _apply(self, node, value) -> None:
+        self.min[node] = self.max[node] = value
+        if node < self.size:
+            self.lazy[node] = value
+
+    def _push(self, node) -> None:
+        if self.lazy[node] is not None:
+            self._apply(2 * node, self.lazy[node])
+            self._apply(2 * node + 1, self.lazy[node])
+            self.lazy[node] = None
+
+    def assign(self, x0: int, x1: int, value, node=1, lo=0, hi=None) -> None:
+        """
+        Set the height of the skyline over [x0, x1) to value
+        """
+        if hi is None:
+            hi = self.size
+        if x1 <= lo or hi <= x0:
+            return
+        if x0 <= lo and hi <= x1:
+            self._apply(node, value)
+            return
+        self._push(node)
+        mid = (lo + hi) // 2
+        self.assign(x0, x1, value, 2 * node, lo, mid)
+        self.assign(x0, x1, value, 2 * node + 1, mid, hi)
+        self._pull(node)
+
+    def height_at(self, x: int):
+        """
+        Get the height of the skyline at x
+        """
+        node, lo, hi = 1, 0, self.size
+        while node < self.size:
+            self._push(node)
+            mid = (lo + hi) // 2
+            if x < mid:
+                node, hi = 2 * node, mid
+            else:
+                node, lo = 2 * node + 1, mid
+        return self.min[node]
+
+    def _first(self, x0: int, pred, node=1, lo=0, hi=None):
+        """
+        Get the first x >= x0 whose node satisfies pred, None if there's none.
+        pred(node) must hold for a node if it holds for any of its leaves.
+        """
+        if hi is None:
+            hi = self.size
+        if hi <= x0 or not pred(node):
+            return None
+        if node >= self.size:
+            return lo
+        self._push(node)
+        mid = (lo + hi) // 2
+        x = self._first(x0, pred, 2 * node, lo, mid)
+        if x is None:
+            x = self._first(x0, pred, 2 * node + 1, mid, hi)
+        return x
+
+    def lowest_gap(self):
+        """
+        Get the lowest, then leftmost gap of the skyline
+
+        Returns:
+            tuple: (x, y, width) of the gap
+        """
+        y = self.min[1]
+        x = self._first(0, lambda node: self.min[node] == y)
+        end = self._first(x, lambda node: self.max[node] != y)
+        if end is None:  # no padding leaves when the width is a power of 2
+            end = self.width
+        return x, y, end - x
+
+    def fill_gap(self, x: int, width: int) -> bool:
+        """
+        Raise the gap at [x, x + width) to its lowest neighbour, wasting the
+        area below. The gap becomes part of the neighbouring segment.
+
+        Returns:
+            bool: False if the gap spans the whole sheet and can't be raised
+        """
+        neighbours = []
+        if x > 0:
+            neighbours.append(self.height_at(x - 1))
+        if x + width < self.width:
+            neighbours.append(self.height_at(x + width))
+        if not neighbours:
+            return False
+        self.assign(x, x + width, min(neighbours))
+        return True
@@ -0,0 +1,507 @@
+import math
+from bisect import bisect_left
+
+
+class OccupancyIndex:
+    """
+    An occupancy index keeps track of the rectangles packed into a sheet and
+    answers "which rectangles are near this area?" queries.
+
+    A rectangle is any object with x, y, width and height attributes,
+    e.g. a Stock. Subclasses decide how the rectangles are bucketed.
+    """
+
+    def insert(self, rect) -> None:
+        """
+        Add a rectangle to the index
+        """
+        raise NotImplementedError
+
+    def remove(self, rect) -> None:
+        """
+        Remove a rectangle from the index
+        """
+        raise NotImplementedError
+
+    def query(self, x, y, width, height) -> list:
+        """
+        Get the candidate rectangles that may intersect the given area.
+        May return extra rectangles, but never misses an intersecting one.
+        """
+        raise NotImplementedError
+
+    def intersects(self, rect) -> bool:
+        """
+        Check if the given rectangle intersects any rectangle in the index
+        """
+        for rect2 in self.query(rect.x, rect.y, rect.width, rect.height):
+            if rect.intersects(rect2):
+                return True
+        return False
+
+    def clear(self) -> None:
+        """
+        Remove all the rectangles from the index
+        """
+        raise NotImplementedError
+
+
+class LinearIndex(OccupancyIndex):
+    """
+    A plain list of rectangles, every query returns all of them. O(n)
+    """
+
+    def __init__(self):
+        self.rects = []
+
+    def insert(self, rect) -> None:
+        self.rects.append(rect)
+
+    def remove(self, rect) -> None:
+        self.rects.remove(rect)
+
+    def query(self, x, y, width, height) -> list:
+        return self.rects
+
+    def clear(self) -> None:
+        self.rects.clear()
+
+
+class GridIndex(OccupancyIndex):
+    """
+    A uniform grid over the sheet. Every rectangle is registered in each cell
+    it covers, so a query only looks at the rectangles in the cells that the
+    queried area covers.
+
+    Without an explicit cell size, the grid starts coarse and halves its
+    cells whenever they hold more than MAX_DENSITY rectangles on average.
+    Packed stocks don't overlap, so this settles at cells about the size of
+    the smallest stocks.
+    """
+
+    # number of cells to aim for when no cell size is given
+    TARGET_CELLS = 1024
+    MAX_DENSITY = 8
+
+    def __init__(self, width, height, cell_size=None):
+        self.width = width
+        self.height = height
+        self.adaptive = cell_size is None
+        if cell_size is None:
+            cell_size = max(1, math.ceil(math.sqrt(width * height / self.TARGET_CELLS)))
+        self.cell_size = cell_size
+        self.cells = {}  # (col, row) -> list of rectangles
+        self.entries = 0  # number of (cell, rectangle) registrations
+        self.max_entries = self._max_entries()
+
+    def _max_entries(self):
+        c = self.cell_size
+        return self.MAX_DENSITY * math.ceil(self.width / c) * math.ceil(self.height / c)
+
+    def _refine(self) -> None:
+        """
+        Halve the cell size, until dense enough, and register the rectangles
+        again
+        """
+        rects = {id(rect): rect for cell in self.cells.values() for rect in cell}
+        self.adaptive = False
+        while self.cell_size > 1 and self.entries > self.max_entries:
+            self.cell_size = max(1, self.cell_size // 2)
+            self.max_entries = self._max_entries()
+            self.clear()
+            for rect in rects.values():
+                self.insert(rect)
+        self.adaptive = True
+
+    def _cell_range(self, x, y, width, height):
+        """
+        Get the columns and rows covered by the given area.
+        Edges are exclusive, but every area covers at least one cell.
+        """
+        c = self.cell_size
+        col0, row0 = math.floor(x / c), math.floor(y / c)
+        col1 = max(col0 + 1, math.ceil((x + width) / c))
+        row1 = max(row0 + 1, math.ceil((y + height) / c))
+        return range(col0, col1), range(row0, row1)
+
+    def insert(self, rect) -> None:
+        cols, rows = self._cell_range(rect.x, rect.y, rect.width, rect.height)
+        for col in cols:
+            for row in rows:
+                self.cells.setdefault((col, row), []).append(rect)
+        self.entries += len(cols) * len(rows)
+        if self.adaptive and self.entries > self.max_entries and self.cell_size > 1:
+            self._refine()
+
+    def remove(self, rect) -> None:
+        cols, rows = self._cell_range(rect.x, rect.y, rect.width, rect.height)
+        for col in cols:
+            for row in rows:
+                cell = self.cells[(col, row)]
+                cell.remove(rect)
+                if not cell:
+                    del self.cells[(col, row)]
+        self.entries -= len(cols) * len(rows)
+
+    def query(self, x, y, width, height) -> list:
+        cols, rows = self._cell_range(x, y, width, height)
+        if len(cols) == 1 and len(rows) == 1:
+            return self.cells.get((cols[0], rows[0]), [])
+
+        # a rectangle can be in several cells, keep each one once
+        seen = set()
+        candidates = []
+        for col in cols:
+            for row in rows:
+                for rect in self.cells.get((col, row), ()):
+                    if id(rect) not in seen:
+                        seen.add(id(rect))
+                        candidates.append(rect)
+        return candidates
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.entries = 0
+
+
+class PersistentGridIndex(GridIndex):
+    """
+    A uniform grid that can be forked in O(1), for packing states that are
+    snapshotted and branched.
+
+    The grid is a list of rows, each a list of cells, each cell a tuple of
+    rectangles. A fork shares all of them: changing a cell copies the list
+    of rows and the row of the cell, the first time the index changes them
+    after the fork, and makes a new tuple for the cell. The rectangles must
+    not move once inserted.
+    """
+
+    def __init__(self, width, height, cell_size=None):
+        if cell_size is None:
+            cell_size = max(1, math.ceil(math.sqrt(width * height / self.TARGET_CELLS)))
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.num_cols = max(1, math.ceil(width / cell_size))
+        self.num_rows = max(1, math.ceil(height / cell_size))
+        self.clear()
+
+    def fork(self) -> "PersistentGridIndex":
+        """
+        Get a copy of the index, sharing the grid until either one changes
+        """
+        other = PersistentGridIndex.__new__(PersistentGridIndex)
+        other.__dict__.update(self.__dict__)
+        self.owned_rows = set()
+        other.owned_rows = set()
+        return other
+
+    def _cell_range(self, x, y, width, height):
+        # the cells outside the sheet are left out
+        cols, rows = super()._cell_range(x, y, width, height)
+        return (
+            range(max(cols.start, 0), min(cols.stop, self.num_cols)),
+            range(max(rows.start, 0), min(rows.stop, self.num_rows)),
+        )
+
+    def _row(self, row) -> list:
+        """
+        Get the row for writing, copying it if it's shared
+        """
+        if row not in self.owned_rows:
+            if not self.owned_rows:  # the list of rows is shared too
+                self.grid = list(self.grid)
+            self.grid[row] = list(self.grid[row])
+            self.owned_rows.add(row)
+        return self.grid[row]
+
+    def insert(self, rect) -> None:
+        cols, rows = self._cell_range(rect.x, rect.y, rect.width, rect.height)
+        for row in rows:
+            cells = self._row(row)
+            for col in cols:
+                cells[col] = cells[col] + (rect,)
+
+    def remove(self, rect) -> None:
+        cols, rows = self._cell_range(rect.x, rect.y, rect.width, rect.height)
+        for row in rows:
+            cells = self._row(row)
+            for col in cols:
+                cells[col] = tuple(r for r in cells[col] if r is not rect)
+
+    def query(self, x, y, width, height) -> list:
+        cols, rows = self._cell_range(x, y, width, height)
+        if len(cols) == 1 and len(rows) == 1:
+            return self.grid[rows[0]][cols[0]]
+
+        # a rectangle can be in several cells, keep each one once
+        seen = set()
+        candidates = []
+        for row in rows:
+            cells = self.grid[row]
+            for col in cols:
+                for rect in cells[col]:
+                    if id(rect) not in seen:
+                        seen.add(id(rect))
+                        candidates.append(rect)
+        return candidates
+
+    def clear(self) -> None:
+        self.grid = [[()] * self.num_cols for _ in range(self.num_rows)]
+        self.owned_rows = set(range(self.num_rows))
+
+
+class _Bucket:
+    """
+    A bucket of SortedRects, with the Pareto front of the sizes of its
+    rectangles: the widths ascending and the heights descending, none of
+    them fits in another. A width x height rectangle fits some rectangle of
+    the bucket iff the first front entry at least width wide is at least
+    height tall.
+    """
+
+    __slots__ = (
+        "keys",
+        "rects",
+        "front_width",
+        "front_height",
+        "max_width",
+        "max_height",
+        "max_short",
+    )
+
+    def __init__(self, keys, rects):
+        self.keys = keys
+        self.rects = rects
+        self.update()
+
+    def update(self):
+        """
+        Rebuild the front from the rectangles
+        """
+        self.front_width, self.front_height = [], []
+        for width, height in sorted(
+            {(rect.width, rect.height) for rect in self.rects}, reverse=True
+        ):
+            # widest first, keep the ones taller than every wider one
+            if not self.front_height or height > self.front_height[-1]:
+                self.front_width.append(width)
+                self.front_height.append(height)
+        self.front_width.reverse()
+        self.front_height.reverse()
+        self._update_maxes()
+
+    def _update_maxes(self):
+        self.max_width = self.front_width[-1]
+        self.max_height = self.front_height[0]
+        self.max_short = max(map(min, self.front_width, self.front_height))
+
+    def insert(self, width, height) -> bool:
+        """
+        Add a size to the front
+
+        Returns:
+            bool: True if the front changed
+        """
+        i = bisect_left(self.front_width, width)
+        if i < len(self.front_width) and self.front_height[i] >= height:
+            return False  # fits in a rectangle already on the front
+        # drop the entries that fit in the new one: the one as wide, and
+        # the narrower ones right before it
+        k = i + 1 if i < len(self.front_width) and self.front_width[i] == width else i
+        j = i
+        while j > 0 and self.front_height[j - 1] <= height:
+            j -= 1
+        self.front_width[j:k] = [width]
+        self.front_height[j:k] = [height]
+        self._update_maxes()
+        return True
+
+    def on_front(self, width, height) -> bool:
+        """
+        Check if the size is an entry of the front
+        """
+        i = bisect_left(self.front_width, width)
+        return (
+            i < len(self.front_width)
+            and self.front_width[i] == width
+            and self.front_height[i] == height
+        )
+
+    def can_fit(self, width, height) -> bool:
+        """
+        Check if a width x height rectangle fits any rectangle of the bucket
+        """
+        i = bisect_left(self.front_width, width)
+        return i < len(self.front_width) and self.front_height[i] >= height
+
+
+class SortedRects:
+    """
+    Rectangles kept sorted by a key function.
+
+    The rectangles are stored in buckets of up to 2 * BUCKET_SIZE entries,
+    each bucket knows exactly which sizes fit one of its rectangles. On top
+    of the buckets, a max segment tree of their widest and tallest
+    rectangles and longest short sides lets a search for a rectangle that
+    fits a given size skip whole runs of buckets that cannot hold one,
+    instead of testing the rectangles one by one.
+    """
+
+    BUCKET_SIZE = 32
+
+    def __init__(self, key):
+        self.key = key
+        self.buckets = []
+        self.maxes = []  # last key of each bucket, to bisect into buckets
+        self.entries = {}  # id(rect) -> sort key of the rect
+        self.count = 0  # tie breaker, keeps the sort stable
+        self.size = 0
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        """
+        Build the segment tree over the buckets, after buckets are added
+        or removed. Each node is (max width, max height, max short side).
+        """
+        leaves = 1
+        while leaves < len(self.buckets):
+            leaves *= 2
+        self.leaves = leaves
+        self.tree = [(-1, -1, -1)] * (2 * leaves)
+        for i, bucket in enumerate(self.buckets):
+            self.tree[leaves + i] = (
+                bucket.max_width,
+                bucket.max_height,
+                bucket.max_short,
+            )
+        for node in range(leaves - 1, 0, -1):
+            self._pull(node)
+
+    def _pull(self, node) -> None:
+        left, right = self.tree[2 * node], self.tree[2 * node + 1]
+        self.tree[node] = (
+            max(left[0], right[0]),
+            max(left[1], right[1]),
+            max(left[2], right[2]),
+        )
+
+    def _update(self, i) -> None:
+        """
+        Update the segment tree after the sizes of bucket i changed
+        """
+        bucket = self.buckets[i]
+        node = self.leaves + i
+        self.tree[node] = (bucket.max_width, bucket.max_height, bucket.max_short)
+        node //= 2
+        while node:
+            self._pull(node)
+            node //= 2
+
+    def add(self, rect) -> None:
+        """
+        Add a rectangle
+        """
+        entry = (self.key(rect), self.count)
+        self.count += 1
+        self.entries[id(rect)] = entry
+        self.size += 1
+
+        if not self.buckets:
+            self.buckets.append(_Bucket([entry], [rect]))
+            self.maxes.append(entry)
+            self._rebuild()
+            return
+
+        i = min(bisect_left(self.maxes, entry), len(self.buckets) - 1)
+        bucket = self.buckets[i]
+        j = bisect_left(bucket.keys, entry)
+        bucket.keys.insert(j, entry)
+        bucket.rects.insert(j, rect)
+        self.maxes[i] = bucket.keys[-1]
+
+        if len(bucket.keys) > 2 * self.BUCKET_SIZE:
+            # split the bucket in half
+            half = len(bucket.keys) // 2
+            upper = _Bucket(bucket.keys[half:], bucket.rects[half:])
+            del bucket.keys[half:]
+            del bucket.rects[half:]
+            bucket.update()
+            self.buckets.insert(i + 1, upper)
+            self.maxes[i] = bucket.keys[-1]
+            self.maxes.insert(i + 1, upper.keys[-1])
+            self._rebuild()
+        elif bucket.insert(rect.width, rect.height):
+            self._update(i)
+
+    def remove(self, rect) -> None:
+        """
+        Remove a rectangle
+        """
+        entry = self.entries.pop(id(rect))
+        self.size -= 1
+        i = bisect_left(self.maxes, entry)
+        bucket = self.buckets[i]
+        j = bisect_left(bucket.keys, entry)
+        del bucket.keys[j]
+        del bucket.rects[j]
+
+        if not bucket.keys:
+            del self.buckets[i]
+            del self.maxes[i]
+            self._rebuild()
+            return
+        self.maxes[i] = bucket.keys[-1]
+        if bucket.on_front(rect.width, rect.height):
+            bucket.update()
+            self._update(i)
+
+    def fits(self, width, height):
+        """
+        Iterate, in key order, over the rectangles that can hold a
+        width x height rectangle
+        """
+        short = min(width, height)
+        tree, leaves = self.tree, self.leaves
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            max_width, max_height, max_short = tree[node]
+            if max_width < width or max_height < height or max_short < short:
+                continue
+            if node < leaves:
+                stack.append(2 * node + 1)
+                stack.append(2 * node)
+                continue
+            bucket = self.buckets[node - leaves]
+            if not bucket.can_fit(width, height):
+                continue
+            for rect in bucket.rects:
+                if rect.width >= width and rect.height >= height:
+                    yield rect
+
+    def first_fit(self, width, height):
+        """
+        Get the first rectangle, in key order, that can hold a width x height
+        rectangle. None if there's no such rectangle.
+        """
+        return next(self.fits(width, height), None)
+
+    def getMaxWidth(self):
+        """
+        Get the width of the widest rectangle, 0 if empty
+        """
+        return max(self.tree[1][0], 0)
+
+    def getMaxHeight(self):
+        """
+        Get the height of the tallest rectangle, 0 if empty
+        """
+        return max(self.tree[1][1], 0)
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket.rects
+
+    def __len__(self) -> int:
+        return self.size
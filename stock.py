@@ -1,3 +1,6 @@
+from spatial import OccupancyIndex, GridIndex
+
+
 class Stock:
     """
     A stock is a rectangular sheet of paper that can be cut into smaller
@@ -79,11 +82,33 @@ class Sheet:
     A sheet is a rectangular space that can be filled with stocks
     """
 
-    def __init__(self, width, height, stocks: list = []) -> None:
+    def __init__(
+        self,
+        width,
+        height,
+        stocks: list = None,
+        index: OccupancyIndex = None,
+        array_backed: bool = False,
+    ) -> None:
+        """
+        Args:
+            width, height: size of the sheet
+            stocks: the stocks to be packed
+            index: occupancy index of the packed stocks, a GridIndex by default
+            array_backed: also keep the packed stocks in NumPy arrays
+                (see PackedArrays), requires numpy
+        """
         self.width = width
         self.height = height
-        self.unpacked_stocks = stocks
+        self.unpacked_stocks = stocks if stocks is not None else []
         self.packed_stocks = []
+        self.index = index if index is not None else GridIndex(width, height)
+        self.arrays = None
+        self.events = None  # placement events, see recordEvents
+        if array_backed:
+            from packed_arrays import PackedArrays
+
+            self.arrays = PackedArrays()
         self.sortStocks()
 
     def addStock(self, stock: Stock) -> None:
@@ -102,6 +127,68 @@ class Sheet:
         # insert the stock
         self.unpacked_stocks.insert(index, stock)
 
+    def insertStocks(self, stocks: list) -> None:
+        """
+        Add the stocks one by one with the rule of addStock, in O(n log n)
+        instead of O(n) per stock. They end up in the same order.
+
+        addStock only ever looks at the stocks of smaller area than every
+        stock before them, the prefix minima: a stock goes before the first
+        one of them that is smaller, or first if there's none. These are
+        kept in a Candidates by area, and the order in a linked list.
+        """
+        from candidates import Candidates
+
+        stocks = self.unpacked_stocks + list(stocks)
+        areas = [stock.getArea() for stock in stocks]
+        n = len(stocks)
+        # the linked list of the stocks, n is the head
+        before, after = [n] * (n + 1), [n] * (n + 1)
+
+        def insert_before(node, i):
+            before[i], after[i] = before[node], node
+            after[before[node]] = before[node] = i
+
+        # the prefix minima: area -> stock, and the lowest and highest areas
+        minima = {}
+        areas_left = Candidates(set(areas), left=False)
+        lowest = highest = None
+        for i in range(n):
+            if i < len(self.unpacked_stocks):
+                insert_before(n, i)  # already there, in order
+                if lowest is None or areas[i] < lowest:
+                    minima[areas[i]] = i
+                    areas_left.add(areas[i])
+                    lowest = areas[i]
+                    highest = highest if highest is not None else lowest
+                continue
+
+            area = areas[i]
+            if lowest is None or area <= lowest:
+                # no smaller stock, first, and the only prefix minimum
+                insert_before(after[n], i)
+                for other in minima:
+                    areas_left.remove(other)
+                minima = {area: i}
+                areas_left.add(area)
+                lowest = highest = area
+            elif area > highest:
+                insert_before(after[n], i)
+                minima[area] = i
+                areas_left.add(area)
+                highest = area
+            else:
+                insert_before(minima[areas_left.last_below(area)], i)
+                if area not in minima:
+                    minima[area] = i
+                    areas_left.add(area)
+
+        order, node = [], after[n]
+        while node != n:
+            order.append(stocks[node])
+            node = after[node]
+        self.unpacked_stocks = order
+
     def addStocks(self, stocks: list) -> None:
         """
         Add a list of stocks to the sheet
@@ -130,11 +217,60 @@ class Sheet:
             return False
 
         # ok to pack the stock
-        stock.setLoc(loc)  # Place the stock in the location
-        self.packed_stocks.append(stock)
+        self._place(stock, loc)
         self.unpacked_stocks.remove(stock)
         return True
 
+    def packStocks(self, placements: list, validate: bool = True) -> list:
+        """
+        Pack many stocks into the sheet, in order
+
+        Same as calling pack for each placement, but the packed stocks are
+        removed from the unpacked stocks in a single pass.
+
+        Args:
+            placements (list): [(stock, (x, y)), ...]
+            validate (bool): validate each packing step. Only skip it for
+                placements known to be valid, e.g. a packing of the same
+                stocks made before
+
+        Returns:
+            list: a bool per placement, True if the packing step was valid.
+        """
+        results = []
+        packed = set()
+        for stock, loc in placements:
+            if validate and not self.validate_pack_step(stock, loc):
+                results.append(False)
+                continue
+            self._place(stock, loc)
+            packed.add(id(stock))
+            results.append(True)
+
+        self.unpacked_stocks[:] = [
+            stock for stock in self.unpacked_stocks if id(stock) not in packed
+        ]
+        return results
+
+    def _place(self, stock: Stock, loc: tuple) -> None:
+        """
+        Place the stock and record it as packed, without any validation
+        """
+        stock.setLoc(loc)  # Place the stock in the location
+        self.packed_stocks.append(stock)
+        self.index.insert(stock)
+        if self.arrays is not None:
+            self.arrays.append(stock.x, stock.y, stock.width, stock.height)
+        if self.events is not None:
+            self.events.append((stock.x, stock.y, stock.width, stock.height))
+
+    def recordEvents(self) -> None:
+        """
+        Record the next placements as events (x, y, width, height), in
+        packing order, e.g. to replay them with VisualSheet.animate
+        """
+        self.events = []
+
     def packNext(self, loc: tuple) -> bool:
         """
         Pack the next stock into the sheet
@@ -157,6 +293,7 @@ class Sheet:
 
         The validation is done by checking if the stock is intersecting with
         any of the stocks in the pattern and if the stock is within the sheet.
+        Only the packed stocks near the new location are checked, see index.
 
         Args:
             stock (Stock): The stock to be validated.
@@ -177,13 +314,46 @@ class Sheet:
             return False
 
         # Check if the stock intersects with any of the stocks in the pattern
-        for stock2 in self.packed_stocks:
-            if stock_new.intersects(stock2):
-                return False
+        if self.index.intersects(stock_new):
+            return False
 
         del stock_new  # free up memory
         return True
 
+    def validate_pack_steps(self, stock: Stock, locs: list) -> list:
+        """
+        Validate packing the stock at many locations at once.
+
+        Gives the same answers as calling validate_pack_step for each
+        location. If the sheet is array backed, all the locations are
+        checked against the packed stocks with vectorized comparisons.
+
+        Args:
+            stock (Stock): The stock to be validated.
+            locs (list): The candidate locations within the sheet. [(x, y), ...]
+
+        Returns:
+            list: a bool per location, True if the packing step is valid.
+        """
+        if self.arrays is None:
+            return [self.validate_pack_step(stock, loc) for loc in locs]
+
+        import numpy as np
+
+        locs = np.asarray(locs).reshape(-1, 2)
+        x, y = locs[:, 0], locs[:, 1]
+        valid = (
+            (x >= 0)
+            & (y >= 0)
+            & (x + stock.width <= self.width)
+            & (y + stock.height <= self.height)
+        )
+        if valid.any():
+            valid[valid] = ~self.arrays.intersects_any(
+                locs[valid], stock.width, stock.height
+            )
+        return valid.tolist()
+
     # useful methods after packing
     def getArea(self) -> int:
         """
@@ -196,6 +366,10 @@ class Sheet:
         Get the lower bound of height of the sheet
         Which is the maximum height that the packed stocks has been placed
         """
+        if len(self.packed_stocks) == 0:
+            return 0
+        if self.arrays is not None:
+            return self.arrays.getLowerBoundHeight()
         return max([stock.y + stock.height for stock in self.packed_stocks])
 
     def getAreaUsed(self) -> int:
@@ -203,6 +377,8 @@ class Sheet:
         Get the area of the sheet that is used by the stocks.
         Sum of the areas of the packed stocks
         """
+        if self.arrays is not None:
+            return self.arrays.getAreaUsed()
         return sum([stock.getArea() for stock in self.packed_stocks])
 
     def getEfficiency(self) -> float:
@@ -214,12 +390,33 @@ class Sheet:
 
     def getStats(self) -> dict:
         """
-        Get the stats of the sheet
-        """
+        Get the stats of the sheet. height_bound and bin_count_bound are
+        lower bounds of the strip height and of the number of sheets needed
+        to pack all the stocks that fit the sheet (see bounds.py),
+        optimality_gap is how far the reached height is from height_bound,
+        None if some stocks are left unpacked
+        """
+        from bounds import (
+            sheet_sizes,
+            strip_height_bound,
+            bin_count_bound,
+            optimality_gap,
+        )
+
+        sizes = sheet_sizes(self)
+        height_bound = strip_height_bound(self.width, sizes)
+        reached_height = self.getLowerBoundHeight()
         stats = {
             "width": self.width,
             "height": self.height,
-            "lower_bound_height": self.getLowerBoundHeight(),
+            "lower_bound_height": reached_height,
+            "height_bound": height_bound,
+            "bin_count_bound": bin_count_bound(self.width, self.height, sizes),
+            "optimality_gap": (
+                optimality_gap(reached_height, height_bound)
+                if len(self.unpacked_stocks) == 0
+                else None
+            ),
             "area": self.getArea(),
             "area_used": self.getAreaUsed(),
             "efficiency": self.getEfficiency(),
@@ -252,75 +449,35 @@ class Sheet:
         filename: str = "output/output.gcode",
         canvas_size_mm: tuple = (210, 297),
         feed_rate: int = 200,
-    ) -> None:
+        optimize: bool = False,
+    ):
         """
         Generate gcode from the sheet
         All the packed stocks have x,y,w,h
+        The gcode is streamed to the file, the sheet is left unchanged, see
+        gcode.gcode_lines to write it to any file-like object.
         Args:
             filename: output filename
+            optimize: merge the shared edges and route the cuts, see gcode.py.
+                Returns the cut and rapid move lengths before and after.
         """
+        if optimize:
+            from gcode import write_optimized_gcode, format_lengths
 
-        # 20mm smaller than the canvas size
-        canvas_size_mm = (canvas_size_mm[0] - 20, canvas_size_mm[1] - 20)
+            lengths = write_optimized_gcode(self, filename, canvas_size_mm, feed_rate)
+            print(format_lengths(lengths))
+            return lengths
 
-        def gen_rectangle_gcode(x, y, w, h, is_stock: bool = True):
-            gcode = [
-                f"G00 X{x} Y{y}",  # Rapid move to starting point
-                f"G00 Z0",  # Optional: Lower the tool before drawing
-                f"G01 X{x + w} F{feed_rate}",  # Draw first side
-                f"G01 Y{y + h}",  # Draw second side
-                f"G01 X{x}",  # Draw third side
-                f"G01 Y{y}",  # Draw fourth side
-                "G00 Z10",
-            ]
-            if is_stock:
-                gcode.extend(
-                    [
-                        # draw a + in the center
-                        f"G00 X{x + w / 2} Y{y + h / 2}",
-                        f"G00 Z0",
-                        f"G01 X{x + w / 2 + 0.02 * w}",
-                        f"G01 X{x + w / 2 - 0.02 * w}",
-                        f"G01 X{x + w / 2}",
-                        f"G01 Y{y + h / 2 + 0.02 * h}",
-                        f"G01 Y{y + h / 2 - 0.02 * h}",
-                        "G00 Z10",  # Optional: Raise the tool after drawing
-                    ]
-                )
-            return "\n".join(gcode) + "\n"
-
-        # sort by x, then y
-        stocks = sorted(self.packed_stocks, key=lambda stock: (stock.y + stock.x))
-
-        # scale the coordinates to fit the canvas
-        for stock in stocks:
-            stock.x = stock.x * canvas_size_mm[0] / self.width
-            stock.y = stock.y * canvas_size_mm[1] / self.height
-            stock.width = stock.width * canvas_size_mm[0] / self.width
-            stock.height = stock.height * canvas_size_mm[1] / self.height
+        from gcode import gcode_lines, write_lines
 
         with open(filename, "w") as f:
             print(f"Exporting gcode to {filename}")
-            # Canvas is 210 x 297 mm
-            f.write("G21 G90\n")  # set units to mm and absolute positioning
-            f.write(f"F{feed_rate}\n")
-            # draw canvas sheet borders
-            gcode_canvas = gen_rectangle_gcode(
-                0, 0, canvas_size_mm[0], canvas_size_mm[1], is_stock=False
-            )
-            f.write(gcode_canvas)
-            # draw stock
-            for stock in stocks:
-                gcode_stock = gen_rectangle_gcode(
-                    stock.x, stock.y, stock.width, stock.height
-                )
-                f.write(gcode_stock)
-
-            f.write("G28\n")  # home all axes
-            f.write("M30\n")  # end program
+            write_lines(gcode_lines(self, canvas_size_mm, feed_rate), f)
 
     @staticmethod
-    def importSheet(filename: str = "output/sheet.txt") -> "Sheet":
+    def importSheet(
+        filename: str = "output/sheet.txt", validate: bool = True
+    ) -> "Sheet":
         """
         Import the sheet data from a file
         Template of file.txt:
@@ -328,19 +485,93 @@ class Sheet:
             stock_width stock_height x y
             ...
 
+        Args:
+            filename: the file written by exportSheet
+            validate: check the layout, see fromLayout
         """
         with open(filename, "r") as f:
             width, height = map(int, f.readline().split())
-            sheet = Sheet(width, height)
-            for line in f.readlines():
-                x, y, w, h = map(int, line.split())
-                sheet.addStock(Stock(w, h))
-                sheet.packNext((x, y))
-            return sheet
+            rows = [tuple(map(int, line.split())) for line in f if line.strip()]
+        return Sheet.fromLayout(width, height, rows, validate)
+
+    @staticmethod
+    def fromLayout(width, height, rows, validate: bool = True) -> "Sheet":
+        """
+        Build a sheet with its stocks packed as in a layout
+
+        The whole layout is checked at once with a sweep line (see
+        verify.py) and the stocks are placed without validating each step.
+        If the check fails, the placements are replayed one by one and the
+        invalid ones are left unpacked.
+
+        Args:
+            width, height: size of the sheet
+            rows: the (x, y, width, height) of the packed stocks
+            validate: check the layout, skip it for layouts known to be
+                valid, e.g. exported from a packing
+        """
+        from verify import verify_layout
+
+        sheet = Sheet(width, height)
+        placements = [(Stock(w, h), (x, y)) for x, y, w, h in rows]
+        if not validate or verify_layout(width, height, rows):
+            sheet.packStocks(placements, validate=False)
+        else:
+            sheet.addStocks([stock for stock, _ in placements])
+            sheet.packStocks(placements)
+        return sheet
+
+    def exportBinary(self, filename: str = "output/sheet.bin") -> None:
+        """
+        Export the sheet data to a binary layout file, see layout.py
+        """
+        from layout import write_layout
+
+        print(f"Exporting sheet to {filename}")
+        if self.arrays is not None:
+            rows = self.arrays.data[: len(self.arrays)]
+        else:
+            rows = [
+                (stock.x, stock.y, stock.width, stock.height)
+                for stock in self.packed_stocks
+            ]
+        write_layout(filename, self.width, self.height, rows)
+
+    @staticmethod
+    def importBinary(
+        filename: str = "output/sheet.bin", validate: bool = True
+    ) -> "Sheet":
+        """
+        Import the sheet data from a binary layout file, see layout.py
+        The sheet is array backed, its arrays are the memory-mapped records.
+
+        Every record still becomes a packed Stock, checked with the sweep
+        line and added to the occupancy index, so this costs about as much
+        as importSheet: only the text parsing is saved. For zero-copy
+        access to the records, use layout.read_layout.
+
+        Args:
+            filename: the file written by exportBinary
+            validate: check the layout, see fromLayout
+        """
+        from layout import read_layout
+        from packed_arrays import PackedArrays
+
+        width, height, arrays = read_layout(filename)
+        sheet = Sheet.fromLayout(width, height, arrays.data.tolist(), validate)
+        if len(sheet.packed_stocks) == len(arrays):
+            sheet.arrays = arrays
+        else:  # only the valid records
+            sheet.arrays = PackedArrays()
+            sheet.arrays.extend(
+                [(s.x, s.y, s.width, s.height) for s in sheet.packed_stocks]
+            )
+        return sheet
 
     def __del__(self):
         del self.unpacked_stocks[:]
         del self.packed_stocks[:]
+        self.index.clear()
         del self
 
     def __str__(self) -> str:
@@ -0,0 +1,175 @@
+from stock import Stock, Sheet
+from algorithm import bin_packing_BLF, bin_packing_skyline
+from bounds import strip_height_bound, optimality_gap
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import functools
+
+# the packers of the candidate heights, name -> function(sheet, rotation)
+# the legacy free space of bin_packing_BLF loses room, it rarely packs
+# every stock whatever the height
+PACKERS = {
+    "maxrects": functools.partial(bin_packing_BLF, free_space="maxrects"),
+    "skyline": bin_packing_skyline,
+    "BLF": bin_packing_BLF,
+}
+
+# the instance packed by this process, set by _init_worker
+_instance = None
+
+
+def _init_worker(width, sizes, packer, rotation) -> None:
+    global _instance
+    _instance = (width, sizes, packer, rotation)
+
+
+def pack_height(height: int) -> tuple:
+    """
+    Pack the instance of this process in a sheet of the given height
+
+    Returns:
+        tuple: (reached, placements) reached is the height reached, None if
+            some stocks didn't fit, placements are the (index, x, y, rotated)
+            of the stocks
+    """
+    width, sizes, packer, rotation = _instance
+    stocks = [Stock(w, h) for w, h in sizes]
+    sheet = Sheet(width, height, list(stocks))
+    PACKERS[packer](sheet, rotation=rotation)
+    if len(sheet.unpacked_stocks) > 0:
+        return None, []
+
+    index = {id(stock): i for i, stock in enumerate(stocks)}
+    placements = [
+        (index[id(s)], s.x, s.y, s.width != sizes[index[id(s)]][0])
+        for s in sheet.packed_stocks
+    ]
+    return sheet.getLowerBoundHeight(), placements
+
+
+def _stacked(width, sizes, rotation) -> tuple:
+    """
+    The trivial packing: the stocks on top of each other, each one at its
+    lowest height that fits the width
+
+    Returns:
+        tuple: (height, placements), see pack_height
+    """
+    height, placements = 0, []
+    for i, (w, h) in enumerate(sizes):
+        rotated = False
+        if rotation:
+            # lying on its longer side if it fits the width
+            rotated = h > w if max(w, h) <= width else w > width
+        if (h if rotated else w) > width:
+            raise ValueError(f"The stock {(w, h)} is wider than the sheet")
+        placements.append((i, 0, height, rotated))
+        height += w if rotated else h
+    return height, placements
+
+
+def _candidate_heights(low: int, high: int, count: int) -> list:
+    """
+    Split [low, high) evenly by count heights, a bisection if count is 1
+    """
+    return sorted({low + (high - low) * i // (count + 1) for i in range(1, count + 1)})
+
+
+def strip_packing(
+    sheet: Sheet,
+    packer: str = "maxrects",
+    rotation: bool = False,
+    workers: int = 1,
+    candidates: int = None,
+) -> Sheet:
+    """
+    Strip packing: find the lowest sheet height at which the packer packs
+    every stock of the sheet. The height is searched between the strip
+    height lower bound (see bounds.strip_height_bound) and the height of
+    the stocks stacked on top of each other. Each round packs several
+    candidate heights that split the range evenly, in a pool of worker
+    processes if workers > 1, and narrows the range to the ones around the
+    lowest packed height.
+
+    The packers are heuristics, packing at a height doesn't prove that no
+    lower height packs, so the result is the lowest height found.
+
+    :param sheet: the sheet of the stocks, nothing packed yet, its height
+        is ignored
+    :param packer: a name of PACKERS
+    :param rotation: whether the stocks can be rotated by 90 degrees
+    :param candidates: heights packed per round, default: the number of
+        workers. The result doesn't depend on the number of workers
+    :return: a new sheet, as high as the packing, with copies of the stocks
+        packed. The given sheet is left unchanged
+    """
+    if packer not in PACKERS:
+        raise ValueError(f"Unknown packer: {packer}")
+    if len(sheet.packed_stocks) > 0:
+        raise ValueError("Strip packing needs a sheet with no packed stocks")
+    if candidates is None:
+        candidates = workers
+    sizes = [(stock.width, stock.height) for stock in sheet.unpacked_stocks]
+
+    # the best packing so far, and the heights left to try: [low, high)
+    high, best = _stacked(sheet.width, sizes, rotation)
+    low = strip_height_bound(sheet.width, sizes, rotation)
+    with contextlib.ExitStack() as stack:
+        initargs = (sheet.width, sizes, packer, rotation)
+        if workers > 1:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(
+                    workers, initializer=_init_worker, initargs=initargs
+                )
+            )
+            pack_all = lambda heights: executor.map(pack_height, heights)
+        else:
+            _init_worker(*initargs)
+            pack_all = lambda heights: map(pack_height, heights)
+
+        while low < high:
+            heights = _candidate_heights(low, high, candidates)
+            results = list(zip(heights, pack_all(heights)))
+            for height, (reached, placements) in results:
+                if reached is not None and reached < high:
+                    high, best = reached, placements
+            # above the highest height that didn't pack, below the best one
+            failed = [h for h, (reached, _) in results if reached is None]
+            low = max([low] + [h + 1 for h in failed if h < high])
+
+    stocks = [Stock(w, h) for w, h in sizes]
+    strip = Sheet(sheet.width, high, list(stocks))
+    for i, _, _, rotated in best:
+        if rotated:
+            stocks[i].rotate90()
+    strip.packStocks([(stocks[i], (x, y)) for i, x, y, _ in best])
+    return strip
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strip packing of testcases")
+    parser.add_argument(
+        "testcase", help="testcase file, e.g. Original_Hopper_Turton/C1_1"
+    )
+    parser.add_argument("--packer", default="maxrects", choices=sorted(PACKERS))
+    parser.add_argument("--rotation", action="store_true", help="stocks may rotate")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--candidates", type=int, help="heights packed per round")
+    parser.add_argument("--output", help="export the packed sheet, e.g. sheet.txt")
+    args = parser.parse_args()
+
+    from benchmark import read_testcase
+
+    sheet = read_testcase(args.testcase)
+    strip = strip_packing(
+        sheet, args.packer, args.rotation, args.workers, args.candidates
+    )
+    sizes = [(stock.width, stock.height) for stock in sheet.unpacked_stocks]
+    bound = strip_height_bound(sheet.width, sizes, args.rotation)
+    print(
+        f"{args.testcase}: height {strip.height} (sheet {sheet.height}), "
+        f"lower bound {bound}, gap {optimality_gap(strip.height, bound):.1%}"
+    )
+    if args.output:
+        strip.exportSheet(args.output)
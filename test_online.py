@@ -0,0 +1,30 @@
+from stock import Stock
+from algorithm import bin_packing_online
+
+
+def test_oversized_stock_keeps_the_current_sheet():
+    stocks = [Stock(5, 5), Stock(50, 50), Stock(5, 5)]
+    events = list(bin_packing_online(20, 20, stocks))
+
+    assert [sheet for sheet, _, _ in events] == [0, None, 0]
+    assert events[1] == (None, stocks[1], None)
+    assert events[2][2] == (5, 0)
+
+
+def test_oversized_stock_with_rotation():
+    stocks = [Stock(5, 5), Stock(30, 10), Stock(5, 5)]
+    events = list(bin_packing_online(20, 20, stocks, rotation=True))
+
+    assert [sheet for sheet, _, _ in events] == [0, None, 0]
+
+
+def test_no_new_sheets_keeps_packing_the_first_sheet():
+    stocks = [Stock(10, 6), Stock(10, 6), Stock(10, 3), Stock(10, 1)]
+    events = list(bin_packing_online(10, 10, stocks, new_sheets=False))
+
+    assert [(sheet, loc) for sheet, _, loc in events] == [
+        (0, (0, 0)),
+        (None, None),
+        (0, (0, 6)),
+        (0, (0, 9)),
+    ]
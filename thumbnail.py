@@ -0,0 +1,92 @@
+from stock import Sheet
+import argparse
+import numpy as np
+
+# RGB colors of the thumbnails
+BACKGROUND = (255, 255, 255)
+FILL = (176, 196, 222)  # lightsteelblue, like VisualSheet
+EDGE = (0, 0, 0)
+
+
+def _rects(sheet: Sheet) -> np.ndarray:
+    if sheet.arrays is not None:
+        return np.asarray(sheet.arrays.data[: len(sheet.arrays)], dtype=np.float64)
+    return np.array(
+        [(s.x, s.y, s.width, s.height) for s in sheet.packed_stocks], dtype=np.float64
+    ).reshape(-1, 4)
+
+
+def _paint(shape, rows0, rows1, cols0, cols1) -> np.ndarray:
+    """
+    Get the mask of the pixels covered by the [rows0, rows1) x [cols0, cols1)
+    boxes: +1 / -1 at their corners of a difference array, summed up
+    """
+    diff = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int32)
+    np.add.at(diff, (rows0, cols0), 1)
+    np.add.at(diff, (rows0, cols1), -1)
+    np.add.at(diff, (rows1, cols0), -1)
+    np.add.at(diff, (rows1, cols1), 1)
+    return diff.cumsum(0).cumsum(1)[: shape[0], : shape[1]] > 0
+
+
+def rasterize(sheet: Sheet, size: int = 256) -> np.ndarray:
+    """
+    Draw the packed stocks of a sheet with NumPy only: filled boxes with a
+    one pixel outline, y pointing up. Every stock is drawn at once with
+    difference arrays, the time doesn't depend on the pixels they cover.
+
+    Args:
+        size: the longer side of the image, in pixels
+
+    Returns:
+        np.ndarray: the (height, width, 3) uint8 RGB image
+    """
+    scale = size / max(sheet.width, sheet.height)
+    shape = (
+        max(1, round(sheet.height * scale)),
+        max(1, round(sheet.width * scale)),
+    )
+    x, y, w, h = _rects(sheet).T
+
+    # the pixels of each stock, at least one
+    cols0 = np.clip(np.floor(x * scale), 0, shape[1] - 1).astype(np.intp)
+    rows0 = np.clip(np.floor(y * scale), 0, shape[0] - 1).astype(np.intp)
+    cols1 = np.clip(np.ceil((x + w) * scale), cols0 + 1, shape[1]).astype(np.intp)
+    rows1 = np.clip(np.ceil((y + h) * scale), rows0 + 1, shape[0]).astype(np.intp)
+
+    filled = _paint(shape, rows0, rows1, cols0, cols1)
+    # the outline: the first and last row and column of each stock
+    edges = (
+        _paint(shape, rows0, rows0 + 1, cols0, cols1)
+        | _paint(shape, rows1 - 1, rows1, cols0, cols1)
+        | _paint(shape, rows0, rows1, cols0, cols0 + 1)
+        | _paint(shape, rows0, rows1, cols1 - 1, cols1)
+    )
+
+    image = np.empty(shape + (3,), dtype=np.uint8)
+    image[:] = BACKGROUND
+    image[filled] = FILL
+    image[edges] = EDGE
+    # the sheet border
+    image[[0, -1], :] = EDGE
+    image[:, [0, -1]] = EDGE
+    return image[::-1]  # the first row of the image is the top of the sheet
+
+
+def save_thumbnail(sheet: Sheet, filename: str, size: int = 256) -> None:
+    """
+    Save a thumbnail of the sheet (see rasterize) with Pillow
+    """
+    from PIL import Image
+
+    Image.fromarray(rasterize(sheet, size)).save(filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thumbnails of exported sheets")
+    parser.add_argument("sheet", help="sheet.txt file, see exportSheet")
+    parser.add_argument("thumbnail", help="output image, e.g. thumbnail.png")
+    parser.add_argument("--size", type=int, default=256, help="longer side, pixels")
+    args = parser.parse_args()
+
+    save_thumbnail(Sheet.importSheet(args.sheet), args.thumbnail, args.size)
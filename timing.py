@@ -0,0 +1,194 @@
+from stock import Stock, Sheet
+from benchmark import DATASET_DIR, PACKERS, read_testcase
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+
+
+def time_packer(packer, filename: str, warmup: int = 2, repeats: int = 10) -> dict:
+    """
+    Time a packer on a testcase: warmup runs first, then repeated runs,
+    each on a fresh copy of the testcase, read once. Copying is not timed,
+    and the garbage collector is off while packing, like in timeit.
+
+    Returns:
+        dict: the median and spread of the packing times (in seconds), and
+            the packing quality of the last run
+    """
+    testcase = read_testcase(filename)
+    sizes = [(stock.width, stock.height) for stock in testcase.unpacked_stocks]
+    times = []
+    for run in range(warmup + repeats):
+        sheet = Sheet(testcase.width, testcase.height, [Stock(w, h) for w, h in sizes])
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            packer(sheet)
+            elapsed = time.perf_counter() - start
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if run >= warmup:
+            times.append(elapsed)
+
+    quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else times * 3
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "max": max(times),
+        "iqr": quartiles[2] - quartiles[0],
+        "repeats": repeats,
+        "lower_bound_height": sheet.getLowerBoundHeight(),
+        "efficiency": sheet.getEfficiency(),
+        "num_unpacked_stocks": len(sheet.unpacked_stocks),
+    }
+
+
+def positive_int(value: str) -> int:
+    """
+    argparse type of the number of timed runs, the median needs at least one
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
+
+
+def run_suite(
+    packers: dict,
+    testcases: list,
+    warmup: int = 2,
+    repeats: int = 10,
+    dataset_dir: str = DATASET_DIR,
+) -> dict:
+    """
+    Time every packer on every testcase in dataset_dir
+
+    Returns:
+        dict: packer name -> testcase -> timing (see time_packer)
+    """
+    results = {}
+    for name, packer in packers.items():
+        results[name] = {}
+        for testcase in testcases:
+            filename = os.path.join(dataset_dir, testcase)
+            timing = time_packer(packer, filename, warmup, repeats)
+            results[name][testcase] = timing
+            print(
+                f"{name:<12}{testcase:<8}"
+                f"median={timing['median'] * 1000:>9.3f}ms "
+                f"iqr={timing['iqr'] * 1000:>8.3f}ms "
+                f"h={timing['lower_bound_height']:<5} "
+                f"u={timing['num_unpacked_stocks']}"
+            )
+    return results
+
+
+def find_regressions(
+    results: dict,
+    baseline: dict,
+    time_threshold: float = 0.25,
+    quality_threshold: float = 0.0,
+) -> list:
+    """
+    Compare the results to a baseline. A packer regresses on a testcase if
+    - its median time is more than time_threshold (relative) slower than
+      the baseline median, plus the iqr of both to allow for noise
+    - its efficiency is more than quality_threshold (absolute) lower, or
+      it reaches a higher lower_bound_height, or leaves more stocks unpacked
+
+    Only the packers and testcases found in both are compared.
+
+    Returns:
+        list: a message for each regression
+    """
+    regressions = []
+    for name, timings in results.items():
+        for testcase, timing in timings.items():
+            base = baseline.get(name, {}).get(testcase)
+            if base is None:
+                continue
+            noise = base["iqr"] + timing["iqr"]
+            limit = base["median"] * (1 + time_threshold) + noise
+            if timing["median"] > limit:
+                regressions.append(
+                    f"{name} {testcase}: slower, median "
+                    f"{timing['median'] * 1000:.3f}ms > {limit * 1000:.3f}ms"
+                )
+            if timing["efficiency"] < base["efficiency"] - quality_threshold:
+                regressions.append(
+                    f"{name} {testcase}: worse efficiency, "
+                    f"{timing['efficiency']} < {base['efficiency']}"
+                )
+            if timing["lower_bound_height"] > base["lower_bound_height"]:
+                regressions.append(
+                    f"{name} {testcase}: higher lower_bound_height, "
+                    f"{timing['lower_bound_height']} > {base['lower_bound_height']}"
+                )
+            if timing["num_unpacked_stocks"] > base["num_unpacked_stocks"]:
+                regressions.append(
+                    f"{name} {testcase}: more unpacked stocks, "
+                    f"{timing['num_unpacked_stocks']} > "
+                    f"{base['num_unpacked_stocks']}"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timing suite of the packers")
+    parser.add_argument(
+        "--dataset",
+        default=DATASET_DIR,
+        help=f"directory of the testcases (default: {DATASET_DIR})",
+    )
+    parser.add_argument("--warmup", type=int, default=2, help="warmup runs")
+    parser.add_argument("--repeats", type=positive_int, default=10, help="timed runs")
+    parser.add_argument(
+        "--packers",
+        nargs="+",
+        choices=list(PACKERS),
+        default=list(PACKERS),
+        help="packers to time (default: all)",
+    )
+    parser.add_argument("--save", help="save the results as a baseline json")
+    parser.add_argument(
+        "--baseline", help="baseline json to compare to, fails on regressions"
+    )
+    parser.add_argument(
+        "--time-threshold",
+        type=float,
+        default=0.25,
+        help="allowed relative slowdown of the median time (default: 0.25)",
+    )
+    parser.add_argument(
+        "--quality-threshold",
+        type=float,
+        default=0.0,
+        help="allowed drop of the efficiency (default: 0.0)",
+    )
+    args = parser.parse_args()
+
+    testcases = sorted(os.listdir(args.dataset))
+    packers = {name: PACKERS[name] for name in args.packers}
+    results = run_suite(packers, testcases, args.warmup, args.repeats, args.dataset)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            f.write(json.dumps(results, indent=4))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(
+            results, baseline, args.time_threshold, args.quality_threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
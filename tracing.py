@@ -0,0 +1,103 @@
+import contextlib
+import json
+import time
+
+
+class Tracer:
+    """
+    Tracer of a packer: counters, observed values and time per phase.
+
+    This one does nothing, it's the default of the packers, so tracing
+    costs a method call when it's off. See CountingTracer.
+    """
+
+    def count(self, name: str, n: int = 1) -> None:
+        """
+        Add n to a counter
+        """
+
+    def observe(self, name: str, value) -> None:
+        """
+        Record a value, e.g. the size of a data structure at each step
+        """
+
+    def phase(self, name: str):
+        """
+        Get a context manager that adds the time spent in it to the phase
+        """
+        return _NO_PHASE
+
+    def report(self) -> dict:
+        """
+        Get the counters, the observed values and the time of each phase
+        """
+        return {}
+
+
+_NO_PHASE = contextlib.nullcontext()
+
+# the default tracer of the packers
+NULL_TRACER = Tracer()
+
+
+class _Phase:
+    __slots__ = ("times", "name", "start")
+
+    def __init__(self, times: dict, name: str):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        total, calls = self.times.get(self.name, (0.0, 0))
+        self.times[self.name] = (total + elapsed, calls + 1)
+
+
+class CountingTracer(Tracer):
+    """
+    A tracer that keeps everything it is told, in memory
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.observations = {}  # name -> [count, total, min, max]
+        self.times = {}  # phase -> (seconds, calls)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value) -> None:
+        observation = self.observations.get(name)
+        if observation is None:
+            self.observations[name] = [1, value, value, value]
+            return
+        observation[0] += 1
+        observation[1] += value
+        observation[2] = min(observation[2], value)
+        observation[3] = max(observation[3], value)
+
+    def phase(self, name: str):
+        return _Phase(self.times, name)
+
+    def report(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "observations": {
+                name: {"count": count, "mean": total / count, "min": low, "max": high}
+                for name, (count, total, low, high) in self.observations.items()
+            },
+            "phases": {
+                name: {"time": seconds, "calls": calls}
+                for name, (seconds, calls) in self.times.items()
+            },
+        }
+
+    def export(self, filename: str) -> None:
+        """
+        Write the report to a json file
+        """
+        with open(filename, "w") as f:
+            f.write(json.dumps(self.report(), indent=4))
@@ -1,22 +1,36 @@
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
+import itertools
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgb
 from stock import Stock, Sheet
 
 
 class VisualSheet:
+    # batched mode: max number of ticks per axis, and of stock labels
+    MAX_TICKS = 25
+    MAX_LABELS = 300
+
     def __init__(
         self,
         sheet: Sheet,
         title: str = "",
         is_txt: bool = True,
         fillcolor: str = "lightsteelblue",
+        batched: bool = False,
     ):
+        """
+        Args:
+            batched: draw the packed stocks as one collection, with fewer
+                labels and ticks, for large sheets (see draw_sheet_batched)
+        """
         self.sheet = sheet
         self.title = title
 
         # custom drawing parameters
         self.is_txt: bool = is_txt
         self.fillcolor: str = fillcolor
+        self.batched: bool = batched
         # matplotlib figure
         # figure is a canvas for the whole visualization
 
@@ -70,7 +84,10 @@ class VisualSheet:
             # sheet ax takes the whole row
             self.ax.set_position([0.05, 0, 0.9, 1])
 
-        self.draw_sheet()
+        if self.batched:
+            self.draw_sheet_batched()
+        else:
+            self.draw_sheet()
 
         if save:
             plt.savefig(
@@ -99,6 +116,151 @@ class VisualSheet:
         self.ax.set_xticks(list(xticks_set))
         self.ax.set_yticks(list(yticks_set))
 
+    def draw_sheet_batched(self):
+        """
+        Draw the sheet with the stocks packed on it, all the stocks as a
+        single PolyCollection. Only the stocks big enough for their text are
+        labelled, the largest MAX_LABELS of them, and the ticks are the
+        stock edges at least 1 / MAX_TICKS of the sheet apart
+        """
+        sheet = self.sheet
+        if sheet.arrays is not None:
+            rects = sheet.arrays.data[: len(sheet.arrays)].astype(float)
+        else:
+            rects = np.array(
+                [(s.x, s.y, s.width, s.height) for s in sheet.packed_stocks],
+                dtype=float,
+            ).reshape(-1, 4)
+        x, y, w, h = rects.T
+
+        corners = [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]
+        vertices = np.stack([np.stack(corner, axis=-1) for corner in corners], axis=1)
+        self.ax.add_collection(
+            PolyCollection(
+                vertices, facecolors=self.fillcolor, edgecolors="black", linewidths=2
+            )
+        )
+
+        if self.is_txt and len(rects) > 0:
+            labels = [f"{int(a)}x{int(b)}" for a, b in zip(w, h)]
+            fits = [self._fits_label(a, b, label) for a, b, label in zip(w, h, labels)]
+            by_area = np.argsort(-(w * h), kind="stable")
+            for i in [i for i in by_area if fits[i]][: self.MAX_LABELS]:
+                self.ax.text(
+                    x[i] + w[i] / 2,
+                    y[i] + h[i] / 2,
+                    labels[i],
+                    ha="center",
+                    va="center",
+                    fontsize=8,
+                    clip_on=True,
+                )
+
+        self.ax.set_xticks(_thin_ticks(np.r_[x, x + w], sheet.width, self.MAX_TICKS))
+        self.ax.set_yticks(_thin_ticks(np.r_[y, y + h], sheet.height, self.MAX_TICKS))
+
+    def _fits_label(self, width, height, label) -> bool:
+        """
+        Check if a stock of the sheet is big enough for its label
+        """
+        # the size of a sheet unit in points, the axes keep the aspect
+        width_in, height_in = self.fig.get_size_inches()
+        points = min(
+            0.9 * width_in * 72 / self.sheet.width,
+            0.9 * height_in * 72 / self.sheet.height,
+        )
+        # a fontsize 8 character is about 5 points wide and 10 points high
+        return width * points >= 5 * len(label) and height * points >= 10
+
+    def animate(self, events=None, filename="output/packing.gif", fps=10, dpi=100):
+        """
+        Replay the packing, one placed stock per frame, and save it as a GIF,
+        or as an MP4 (needs ffmpeg). A frame only draws the artists of its
+        stock, see _frames.
+
+        Args:
+            events: the placement events (x, y, width, height) in order,
+                default: the events recorded by the sheet (see
+                Sheet.recordEvents), else its packed stocks
+            filename: a .gif, or a video file e.g. .mp4
+            fps: frames per second
+            dpi: resolution of the frames
+        """
+        if events is None:
+            events = self.sheet.events
+        if events is None:
+            events = [(s.x, s.y, s.width, s.height) for s in self.sheet.packed_stocks]
+
+        # the sheet ax takes the whole row, with the ticks of every frame
+        self.ax_unpacked.set_visible(False)
+        self.ax.set_position([0.05, 0, 0.9, 1])
+        sheet = self.sheet
+        x, y, w, h = np.array(events, dtype=float).reshape(-1, 4).T
+        self.ax.set_xticks(_thin_ticks(np.r_[x, x + w], sheet.width, self.MAX_TICKS))
+        self.ax.set_yticks(_thin_ticks(np.r_[y, y + h], sheet.height, self.MAX_TICKS))
+
+        frames = self._frames(events, dpi)
+        if filename.endswith(".gif"):
+            from PIL import Image
+
+            # one palette for every frame, quick to map and small to save
+            first = next(frames)
+            palette = _palette(first, self.fillcolor)
+            # 1 byte per pixel, the frames are kept until they are saved
+            images = [
+                Image.fromarray(frame).quantize(
+                    palette=palette, dither=Image.Dither.NONE
+                )
+                for frame in itertools.chain([first], frames)
+            ]
+            images[0].save(
+                filename,
+                save_all=True,
+                append_images=images[1:],
+                duration=1000 / fps,
+                loop=0,
+                optimize=False,
+            )
+        else:
+            _write_video(frames, filename, fps)
+        plt.close(self.fig)
+
+    def _frames(self, events, dpi):
+        """
+        Generate the frames of animate as (height, width, 3) arrays: the
+        figure is drawn once, then each frame only draws the artists of its
+        stock over the previous one
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        canvas = FigureCanvasAgg(self.fig)
+        self.fig.set_dpi(dpi)
+        canvas.draw()
+        yield np.asarray(canvas.buffer_rgba())[..., :3].copy()  # the empty sheet
+        for x, y, width, height in events:
+            patch = plt.Rectangle(
+                (x, y),
+                width,
+                height,
+                edgecolor="black",
+                facecolor=self.fillcolor,
+                lw=2,
+            )
+            self.ax.draw_artist(self.ax.add_patch(patch))
+            label = f"{int(width)}x{int(height)}"
+            if self.is_txt and self._fits_label(width, height, label):
+                text = self.ax.text(
+                    x + width / 2,
+                    y + height / 2,
+                    label,
+                    ha="center",
+                    va="center",
+                    fontsize=8,
+                    clip_on=True,
+                )
+                self.ax.draw_artist(text)
+            yield np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
     def draw_unpacked(self):
         """
         Draw the unpacked stocks,
@@ -264,6 +426,77 @@ class VisualSheet:
         )
 
 
+def _palette(frame, fillcolor):
+    """
+    Get a palette image for the frames of animate: the colors of the empty
+    sheet, and the fill color blended with black and white by the edges
+    and labels
+    """
+    from PIL import Image
+
+    fill = np.array(to_rgb(fillcolor)) * 255
+    t = np.linspace(0, 1, 64)[:, None]
+    blends = np.concatenate([fill * (1 - t), fill + (255 - fill) * t])
+    colors = np.concatenate([frame.reshape(-1, 3), blends.round().astype(np.uint8)])
+    return Image.fromarray(colors[None]).quantize(colors=256)
+
+
+def _write_video(frames, filename, fps) -> None:
+    """
+    Stream the (height, width, 3) frames to ffmpeg, one at a time
+    """
+    import shutil
+    import subprocess
+
+    ffmpeg = shutil.which(plt.rcParams["animation.ffmpeg_path"])
+    if ffmpeg is None:
+        raise RuntimeError("Saving a video needs ffmpeg, save a .gif instead")
+    first = next(frames)
+    height, width, _ = first.shape
+    command = [
+        ffmpeg,
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "-s",
+        f"{width}x{height}",
+        "-r",
+        str(fps),
+        "-i",
+        "-",
+        # the usual mp4 encoders need even sizes
+        "-vf",
+        "pad=ceil(iw/2)*2:ceil(ih/2)*2:color=white",
+        "-pix_fmt",
+        "yuv420p",
+        filename,
+    ]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as ffmpeg_process:
+        ffmpeg_process.stdin.write(first.tobytes())
+        for frame in frames:
+            ffmpeg_process.stdin.write(frame.tobytes())
+        ffmpeg_process.stdin.close()
+    if ffmpeg_process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to write {filename}")
+
+
+def _thin_ticks(edges, limit, max_ticks) -> list:
+    """
+    Get 0, limit and the edges at least limit / max_ticks apart
+    """
+    spacing = limit / max_ticks
+    ticks = [0]
+    for edge in np.unique(edges).tolist():
+        if edge - ticks[-1] >= spacing and limit - edge >= spacing:
+            ticks.append(edge)
+    ticks.append(limit)
+    return ticks
+
+
 if __name__ == "__main__":
     from algorithm import bin_packing_BLF
 